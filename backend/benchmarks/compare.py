@@ -0,0 +1,63 @@
+"""
+Compares two result files from run.py, scenario by scenario.
+
+    python backend/benchmarks/compare.py before.json after.json
+"""
+import json
+import sys
+
+# (metric, whether bigger is better)
+METRICS = (
+    ("rps", True),
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+    ("peak_rss_mb", False),
+    ("errors", False),
+)
+
+
+def change(before, after, higher_is_better: bool) -> str:
+    if before is None or after is None:
+        return "n/a"
+    if before == after:
+        return "="
+    if not before:
+        return "new"
+    percent = (after - before) / before * 100
+    better = (percent > 0) == higher_is_better
+    return f"{percent:+.1f}% ({'better' if better else 'worse'})"
+
+
+def compare(before: dict, after: dict) -> list:
+    lines = [f"before: {before['meta'].get('commit')}  after: {after['meta'].get('commit')}"]
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        lines.append(f"\n{name}")
+        if old is None:
+            lines.append("  not in the first file")
+            continue
+        if "error" in old or "error" in new:
+            lines.append(f"  failed: {old.get('error') or new.get('error')}")
+            continue
+        for metric, higher_is_better in METRICS:
+            lines.append(f"  {metric:<12} {old.get(metric)!s:>12} -> {new.get(metric)!s:>12}  "
+                         f"{change(old.get(metric), new.get(metric), higher_is_better)}")
+    return lines
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__.strip())
+        return 2
+    with open(argv[0]) as f:
+        before = json.load(f)
+    with open(argv[1]) as f:
+        after = json.load(f)
+    print("\n".join(compare(before, after)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
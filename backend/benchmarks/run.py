@@ -0,0 +1,440 @@
+"""
+Load benchmarks for mock-engine and manager-api.
+
+Both apps run in-process against a throwaway SQLite database and an
+in-memory Redis (fakeredis), driven by a concurrent httpx client over
+ASGI, so results depend only on this machine and the code under test.
+Every scenario runs in its own subprocess, which keeps their state and
+peak RSS apart.
+
+    python backend/benchmarks/run.py --out bench.json
+    python backend/benchmarks/compare.py before.json after.json
+"""
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ("static", "faker", "stateful", "chaos", "ws_fanout", "login")
+
+SLUG = "bench"
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+
+# A list of 50 Faker-generated users, the kind of body that exercises the renderer
+FAKER_BODY = json.dumps({
+    "$repeat": 50,
+    "$item": {
+        "id": "{{Faker.uuid4()}}",
+        "name": "{{Faker.name()}}",
+        "email": "{{Faker.email()}}",
+        "address": "{{Faker.address()}}",
+        "company": "{{Faker.company()}}",
+    }
+})
+CHAOS_DELAY_MS = 20
+# How long ws_fanout waits for the last records to reach every client
+WS_DRAIN_TIMEOUT = 30.0
+
+
+# --- In-process apps ---
+
+def load_service(alias: str, directory: Path, server):
+    """
+    Imports a service's `app` package under `alias` (both services call
+    their package `app`) with its Redis clients swapped for fakeredis
+    ones before any other module imports them.
+    """
+    import fakeredis
+    import redis.asyncio
+
+    package = directory / "app"
+    spec = importlib.util.spec_from_file_location(
+        alias, package / "__init__.py", submodule_search_locations=[str(package)]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[alias] = module
+    spec.loader.exec_module(module)
+
+    database = importlib.import_module(f"{alias}.database")
+    for name in ("redis_client", "async_redis_client"):
+        client = getattr(database, name, None)
+        if client is None:
+            continue
+        decode = client.connection_pool.connection_kwargs.get("decode_responses", False)
+        fake = fakeredis.FakeAsyncRedis if isinstance(client, redis.asyncio.Redis) else fakeredis.FakeRedis
+        setattr(database, name, fake(server=server, decode_responses=decode))
+    return importlib.import_module(f"{alias}.main")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Runs an app's startup and shutdown handlers through the ASGI lifespan protocol."""
+    to_app, from_app = asyncio.Queue(), asyncio.Queue()
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, to_app.get, from_app.put))
+    await to_app.put({"type": "lifespan.startup"})
+    message = await from_app.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"Startup failed: {message.get('message')}")
+    try:
+        yield
+    finally:
+        await to_app.put({"type": "lifespan.shutdown"})
+        await from_app.get()
+        await task
+
+
+class WebSocketClient:
+    """Minimal in-process client for an ASGI WebSocket route; httpx has none."""
+
+    def __init__(self, app, url: str):
+        path, _, query = url.partition("?")
+        self.app = app
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [(b"host", b"manager")],
+            "client": ("127.0.0.1", 0),
+            "server": ("manager", 80),
+            "subprotocols": [],
+        }
+        self._to_app = asyncio.Queue()
+        self._from_app = asyncio.Queue()
+        self._task = None
+
+    async def connect(self):
+        self._task = asyncio.create_task(self.app(self.scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"WebSocket rejected: {message}")
+
+    async def receive_text(self) -> str:
+        message = await self._from_app.get()
+        if message["type"] != "websocket.send":
+            raise ConnectionError(f"WebSocket closed: {message}")
+        return message["text"]
+
+    async def close(self):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+
+
+class Bench:
+    """Both apps sharing one SQLite file and one fake Redis server, as they share MySQL and Redis."""
+
+    def __init__(self, workdir: Path):
+        import fakeredis
+        import httpx
+
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+        server = fakeredis.FakeServer()
+        self.manager = load_service("manager_app", BACKEND / "manager-api", server)
+        self.engine = load_service("engine_app", BACKEND / "mock-engine", server)
+        self.manager_client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=self.manager.app), base_url="http://manager", timeout=60
+        )
+        self.engine_client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=self.engine.app), base_url="http://engine", timeout=60
+        )
+        self._stack = AsyncExitStack()
+
+    async def __aenter__(self):
+        await self._stack.enter_async_context(lifespan(self.manager.app))
+        await self._stack.enter_async_context(lifespan(self.engine.app))
+        await self._stack.enter_async_context(self.manager_client)
+        await self._stack.enter_async_context(self.engine_client)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._stack.aclose()
+
+    async def create_project(self, endpoints: list) -> str:
+        """Sets up a user, organization and project through manager-api; returns the user's token."""
+        m = self.manager_client
+        (await m.post("/users/register", json={"email": EMAIL, "password": PASSWORD})).raise_for_status()
+        token = (await m.post("/token", data={"username": EMAIL, "password": PASSWORD})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        org = (await m.post("/organizations", json={"name": "Bench"}, headers=headers)).json()
+        project = (await m.post(f"/organizations/{org['id']}/projects",
+                                json={"name": "Bench", "url_slug": SLUG}, headers=headers)).json()
+        for method, path, response in endpoints:
+            (await m.post(f"/projects/{project['id']}/endpoints",
+                          json={"method": method, "path": path, "response": response},
+                          headers=headers)).raise_for_status()
+        return token
+
+    def mock(self, path: str, method: str = "GET", **kwargs):
+        return self.engine_client.request(method, f"/mock/{SLUG}{path}", **kwargs)
+
+
+# --- Measurement ---
+
+async def drive(send, total: int, concurrency: int):
+    """
+    Calls `send(i)` for i in range(total) from `concurrency` workers.
+    `send` returns whether the response was the expected one.
+    Returns (latencies in seconds, errors, elapsed seconds).
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            ok = await send(i)
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(ordered: list, p: float):
+    """Nearest-rank percentile of sorted latencies, in milliseconds."""
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, -(-len(ordered) * p // 100) - 1))
+    return round(ordered[int(index)] * 1000, 3)
+
+
+def summarize(latencies: list, errors: int, elapsed: float, **extra) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(ordered) / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile(ordered, 50),
+        "p95_ms": percentile(ordered, 95),
+        "p99_ms": percentile(ordered, 99),
+        **extra,
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def expect(*statuses):
+    def check(response):
+        return response.status_code in statuses
+    return check
+
+
+# --- Scenarios ---
+
+async def get_scenario(bench: Bench, args, path: str, response: dict) -> dict:
+    await bench.create_project([("GET", path, response)])
+    ok = expect(response.get("status_code", 200))
+
+    async def send(i):
+        return ok(await bench.mock(path))
+
+    await drive(send, args.warmup, args.concurrency)
+    return summarize(*await drive(send, args.requests, args.concurrency))
+
+
+async def scenario_static(bench: Bench, args) -> dict:
+    body = json.dumps({"status": "ok", "items": list(range(20))})
+    return await get_scenario(bench, args, "/static", {"body": body})
+
+
+async def scenario_faker(bench: Bench, args) -> dict:
+    return await get_scenario(bench, args, "/users", {"body": FAKER_BODY})
+
+
+async def scenario_chaos(bench: Bench, args) -> dict:
+    result = await get_scenario(bench, args, "/slow", {"body": '{"ok": true}', "delay_ms": CHAOS_DELAY_MS})
+    result["delay_ms"] = CHAOS_DELAY_MS
+    return result
+
+
+async def scenario_stateful(bench: Bench, args) -> dict:
+    """Alternating POSTs and page reads against a collection of --collection-size items."""
+    await bench.create_project([
+        ("POST", "/items", {"status_code": 201}),
+        ("GET", "/items", {"body": "[]"}),
+    ])
+
+    async def add(i):
+        return expect(201)(await bench.mock("/items", "POST", json={"name": f"item {i}", "n": i}))
+
+    await drive(add, args.collection_size, args.concurrency)
+
+    async def send(i):
+        if i % 2:
+            return expect(201)(await bench.mock("/items", "POST", json={"name": f"extra {i}", "n": i}))
+        offset = (i * 7919) % args.collection_size
+        return expect(200)(await bench.mock("/items", params={"offset": offset, "limit": 50}))
+
+    return summarize(*await drive(send, args.requests, args.concurrency), collection_size=args.collection_size)
+
+
+async def scenario_ws_fanout(bench: Bench, args) -> dict:
+    """
+    --ws-clients dashboards watch the project's logs while mock traffic
+    runs; latency is from the engine logging a request to each client
+    receiving it.
+    """
+    token = await bench.create_project([("GET", "/ping", {"body": '"pong"'})])
+    clients = [WebSocketClient(bench.manager.app, f"/ws/logs?token={token}&project_slug={SLUG}")
+               for _ in range(args.ws_clients)]
+    await asyncio.gather(*(client.connect() for client in clients))
+    latencies = []
+
+    async def collect(client):
+        for _ in range(args.requests):
+            record = json.loads(await client.receive_text())
+            latencies.append(time.time() - record["timestamp"])
+
+    async def send(i):
+        return expect(200)(await bench.mock("/ping"))
+
+    started = time.perf_counter()
+    collectors = [asyncio.create_task(collect(client)) for client in clients]
+    _, request_errors, _ = await drive(send, args.requests, args.concurrency)
+    done, pending = await asyncio.wait(collectors, timeout=WS_DRAIN_TIMEOUT)
+    elapsed = time.perf_counter() - started
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*(client.close() for client in clients))
+
+    missing = args.requests * len(clients) - len(latencies)
+    return summarize(latencies, missing + request_errors, elapsed,
+                     clients=len(clients), records=args.requests)
+
+
+async def scenario_login(bench: Bench, args) -> dict:
+    """A burst of logins for one user: bcrypt verification under concurrency."""
+    await bench.create_project([])
+
+    async def send(i):
+        response = await bench.manager_client.post("/token", data={"username": EMAIL, "password": PASSWORD})
+        return expect(200)(response)
+
+    return summarize(*await drive(send, args.login_requests, args.concurrency),
+                     bcrypt_rounds=int(os.getenv("BCRYPT_ROUNDS", "12")))
+
+
+async def run_scenario(name: str, args, workdir: Path) -> dict:
+    async with Bench(workdir) as bench:
+        result = await globals()[f"scenario_{name}"](bench, args)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+# --- Runner ---
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent client workers")
+    parser.add_argument("--warmup", type=int, default=200, help="unmeasured requests first")
+    parser.add_argument("--collection-size", type=int, default=10000, help="items preloaded for stateful")
+    parser.add_argument("--ws-clients", type=int, default=50, help="WebSocket clients for ws_fanout")
+    parser.add_argument("--login-requests", type=int, default=100, help="logins for the login burst")
+    # Internal: run a single scenario in this process and write its result here
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=BACKEND,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def run_child(args):
+    result_path = Path(args.result)
+    result = asyncio.run(run_scenario(args.child, args, result_path.parent))
+    result_path.write_text(json.dumps(result))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        return run_child(args)
+
+    results = {}
+    for name in args.scenarios:
+        with tempfile.TemporaryDirectory() as workdir:
+            result_path = Path(workdir) / "result.json"
+            command = [sys.executable, __file__, *(argv or sys.argv[1:]), "--child", name, "--result", str(result_path)]
+            # The apps print on startup and shutdown; keep that out of the way
+            process = subprocess.run(command, stdout=subprocess.DEVNULL, env={**os.environ, "PYTHONHASHSEED": "0"})
+            if process.returncode or not result_path.exists():
+                results[name] = {"error": f"exited with status {process.returncode}"}
+            else:
+                results[name] = json.loads(result_path.read_text())
+        result = results[name]
+        if "error" in result:
+            print(f"{name:<10} {result['error']}")
+        else:
+            print(f"{name:<10} {result['rps']:>10} req/s  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+                  f"p99 {result['p99_ms']} ms  errors {result['errors']}  rss {result['peak_rss_mb']} MB")
+
+    report = {
+        "meta": {
+            **git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ("out", "child", "result")},
+        },
+        "scenarios": results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Wrote {args.out}")
+    return 1 if any("error" in result for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
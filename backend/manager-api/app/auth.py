@@ -1,5 +1,9 @@
 from passlib.context import CryptContext
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta, timezone
+import asyncio
+import threading
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -12,14 +16,124 @@ SECRET_KEY = os.getenv("I LOVE MY COUNTRY", "fallback_dev_key") # <-- NEW LINE
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost. Hashes made with a different cost are upgraded on next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hashing runs in its own processes so login bursts can't fill the threadpool
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs allowed to wait for a worker before new ones are turned away with 503
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT_S", "5"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """Returns (is_valid, new_hash); new_hash is set when the cost changed."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+
+# --- Hashing Executor ---
+
+_hash_pool = None
+_hash_lock = threading.Lock()
+_hash_jobs = 0  # submitted and not yet finished, across all threads
+
+
+def _get_hash_pool():
+    global _hash_pool
+    with _hash_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        return _hash_pool
+
+
+def _discard_hash_pool(pool):
+    """Drops a pool whose worker died, so the next call starts a new one."""
+    global _hash_pool
+    with _hash_lock:
+        if _hash_pool is pool:
+            _hash_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _hash_job_done(_future):
+    global _hash_jobs
+    with _hash_lock:
+        _hash_jobs -= 1
+
+
+def _hashing_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many authentication requests, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _hashing_failed():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is temporarily unavailable, try again",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def run_hashing(func, *args):
+    """
+    Runs a bcrypt call on the hashing pool without holding a threadpool
+    thread. Jobs beyond HASH_WORKERS + HASH_QUEUE_SIZE are rejected up
+    front, and a job that can't finish within HASH_TIMEOUT gives a 503.
+    If a worker dies (e.g. OOM-killed) the pool is replaced and the
+    affected calls get a 503.
+    """
+    global _hash_jobs
+    pool = _get_hash_pool()
+    with _hash_lock:
+        if _hash_jobs >= HASH_WORKERS + HASH_QUEUE_SIZE:
+            raise _hashing_busy()
+        _hash_jobs += 1
+    try:
+        future = pool.submit(func, *args)
+    except BrokenProcessPool:
+        _hash_job_done(None)
+        _discard_hash_pool(pool)
+        raise _hashing_failed()
+    except Exception:
+        _hash_job_done(None)
+        raise
+    # The slot is only freed once the process is done with the job,
+    # even if we stop waiting for it.
+    future.add_done_callback(_hash_job_done)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=HASH_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise _hashing_busy()
+    except BrokenProcessPool:
+        _discard_hash_pool(pool)
+        raise _hashing_failed()
+
+
+async def hash_password(password: str) -> str:
+    return await run_hashing(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    """Async verify_and_update_password, run on the hashing pool."""
+    return await run_hashing(verify_and_update_password, plain_password, hashed_password)
+
+
+def shutdown_hashing():
+    global _hash_pool
+    with _hash_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=False, cancel_futures=True)
+            _hash_pool = None
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -37,7 +151,7 @@ def decode_access_token(token: str):
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return schemas.TokenData(email=email)
+        return schemas.TokenData(email=email, expires_at=payload.get("exp"))
     except (JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,5 +1,28 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, insert, literal, select
+from sqlalchemy.orm import Session, aliased, make_transient_to_detached, selectinload
+import json
+import redis
 from . import models, schemas, auth
+from .cache import token_cache, role_cache, MISSING
+from .database import redis_client, CONFIG_CHANNEL
+
+
+# --- Mock Engine Cache Invalidation ---
+
+def publish_config_change(project_id: int | None = None, slug: str | None = None,
+                          organization_id: int | None = None):
+    """
+    Tells every mock engine process to drop its cached routes for a project
+    (or for all of an organization's projects).
+    Called after the change has been committed, so a reload sees the new rows.
+    """
+    message = json.dumps({"project_id": project_id, "slug": slug, "organization_id": organization_id})
+    try:
+        redis_client.publish(CONFIG_CHANNEL, message)
+    except redis.RedisError as e:
+        # The engine flushes its whole cache when it reconnects, so a missed
+        # message can't leave it stale for longer than the outage.
+        print(f"Failed to publish config change: {e}")
 
 
 # --- User Functions ---
@@ -7,24 +30,61 @@ def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str | None = None):
+    if hashed_password is None:
+        hashed_password = auth.get_password_hash(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user(db_user.email)
     return db_user
 
 
+def update_password_hash(db: Session, user: models.User, hashed_password: str):
+    """Stores a re-hashed password, e.g. after BCRYPT_ROUNDS changed."""
+    user.hashed_password = hashed_password
+    db.commit()
+    invalidate_user(user.email)
+
+
+# --- Cached Identity ---
+# get_current_user caches a plain snapshot of the user's columns per token
+# and re-attaches it to each request's session without a query.
+
+USER_SNAPSHOT_COLUMNS = ("id", "email", "is_active", "created_at")
+
+
+def user_snapshot(user: models.User) -> dict:
+    return {column: getattr(user, column) for column in USER_SNAPSHOT_COLUMNS}
+
+
+def user_from_snapshot(db: Session, snapshot: dict) -> models.User:
+    """A session-bound User built from a snapshot; other columns load lazily."""
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def invalidate_user(email: str):
+    """Call after committing any change to a user row."""
+    token_cache.delete_where(lambda snapshot: snapshot["email"] == email)
+
+
 # --- RBAC & Member Functions ---
 
 def get_user_role(db: Session, user_id: int, org_id: int):
+    role = role_cache.get((user_id, org_id))
+    if role is not MISSING:
+        return role
+
     member = db.query(models.OrganizationMember) \
         .filter_by(user_id=user_id, organization_id=org_id) \
         .first()
-    if member:
-        return member.role
-    return None
+    role = member.role if member else None
+    # "Not a member" is cached too; add_organization_member clears it
+    role_cache.set((user_id, org_id), role)
+    return role
 
 
 def add_organization_member(db: Session, org_id: int, user: models.User, role: models.Role):
@@ -36,6 +96,7 @@ def add_organization_member(db: Session, org_id: int, user: models.User, role: m
     db.add(db_member)
     db.commit()
     db.refresh(db_member)
+    role_cache.delete((user.id, org_id))
     return db_member
 
 
@@ -47,7 +108,7 @@ def get_organization_members(db: Session, org_id: int):
 
 # --- Organization Functions ---
 def create_organization(db: Session, org: schemas.OrganizationCreate, user: models.User):
-    db_org = models.Organization(name=org.name)
+    db_org = models.Organization(**org.model_dump())
     db.add(db_org)
     db.commit()
     db.refresh(db_org)
@@ -55,31 +116,193 @@ def create_organization(db: Session, org: schemas.OrganizationCreate, user: mode
     return db_org
 
 
-def get_user_organizations(db: Session, user: models.User):
-    return db.query(models.Organization) \
+def _count_by(db: Session, group_column, count_column, ids: list) -> dict:
+    """One GROUP BY query: {group id: row count} for the given ids."""
+    if not ids:
+        return {}
+    rows = db.query(group_column, func.count(count_column)) \
+        .filter(group_column.in_(ids)) \
+        .group_by(group_column) \
+        .all()
+    return dict(rows)
+
+
+def get_user_organizations(db: Session, user: models.User, after_id: int = 0, limit: int = 50):
+    """
+    One page of the user's organizations as summaries, ordered by id.
+    Fetches up to limit + 1 rows so the caller can tell if there's more.
+    Always three queries, however many orgs, projects or members there are.
+    """
+    rows = db.query(models.Organization, models.OrganizationMember.role) \
         .join(models.OrganizationMember) \
-        .filter(models.OrganizationMember.user_id == user.id) \
+        .filter(models.OrganizationMember.user_id == user.id, models.Organization.id > after_id) \
+        .order_by(models.Organization.id) \
+        .limit(limit + 1) \
         .all()
+    org_ids = [org.id for org, _ in rows]
+    project_counts = _count_by(db, models.Project.organization_id, models.Project.id, org_ids)
+    member_counts = _count_by(db, models.OrganizationMember.organization_id, models.OrganizationMember.id, org_ids)
+    return [
+        schemas.OrganizationSummary(
+            id=org.id,
+            name=org.name,
+            rate_limit_rps=org.rate_limit_rps,
+            rate_limit_burst=org.rate_limit_burst,
+            created_at=org.created_at,
+            role=role,
+            project_count=project_counts.get(org.id, 0),
+            member_count=member_counts.get(org.id, 0),
+        )
+        for org, role in rows
+    ]
+
+
+def get_organization_detail(db: Session, org_id: int, role: models.Role | None = None):
+    """The organization with its members (and their users) loaded in batches."""
+    org = db.query(models.Organization) \
+        .options(selectinload(models.Organization.members).selectinload(models.OrganizationMember.user)) \
+        .filter(models.Organization.id == org_id) \
+        .first()
+    if org is None:
+        return None
+    project_count = db.query(func.count(models.Project.id)) \
+        .filter(models.Project.organization_id == org_id) \
+        .scalar()
+    return schemas.Organization(
+        id=org.id,
+        name=org.name,
+        rate_limit_rps=org.rate_limit_rps,
+        rate_limit_burst=org.rate_limit_burst,
+        created_at=org.created_at,
+        role=role,
+        project_count=project_count,
+        member_count=len(org.members),
+        members=[schemas.Member(user=member.user, role=member.role) for member in org.members],
+    )
+
+
+def update_organization(db: Session, org_id: int, update: schemas.OrganizationUpdate,
+                        role: models.Role | None = None):
+    org = db.query(models.Organization).filter(models.Organization.id == org_id).first()
+    for field, value in update.model_dump(exclude_unset=True).items():
+        setattr(org, field, value)
+    db.commit()
+    publish_config_change(organization_id=org_id)
+    return get_organization_detail(db, org_id=org_id, role=role)
 
 
 # --- Project Functions ---
 
 def create_project(db: Session, project: schemas.ProjectCreate, org_id: int):
-    db_project = models.Project(
-        name=project.name,
-        url_slug=project.url_slug,
-        organization_id=org_id
-    )
+    db_project = models.Project(**project.model_dump(), organization_id=org_id)
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    publish_config_change(project_id=db_project.id, slug=db_project.url_slug)
     return db_project
 
 
-def get_organization_projects(db: Session, org_id: int):
-    return db.query(models.Project) \
-        .filter(models.Project.organization_id == org_id) \
+def get_organization_projects(db: Session, org_id: int, after_id: int = 0, limit: int = 50):
+    """One page of an organization's projects as summaries (limit + 1 rows, see above)."""
+    projects = db.query(models.Project) \
+        .filter(models.Project.organization_id == org_id, models.Project.id > after_id) \
+        .order_by(models.Project.id) \
+        .limit(limit + 1) \
         .all()
+    endpoint_counts = _count_by(db, models.Endpoint.project_id, models.Endpoint.id, [p.id for p in projects])
+    return [project_summary(project, endpoint_counts.get(project.id, 0)) for project in projects]
+
+
+def project_summary(project: models.Project, endpoint_count: int) -> schemas.ProjectSummary:
+    return schemas.ProjectSummary(
+        id=project.id,
+        name=project.name,
+        url_slug=project.url_slug,
+        faker_seed=project.faker_seed,
+        rate_limit_rps=project.rate_limit_rps,
+        rate_limit_burst=project.rate_limit_burst,
+        state_max_items=project.state_max_items,
+        state_max_bytes=project.state_max_bytes,
+        state_ttl_s=project.state_ttl_s,
+        organization_id=project.organization_id,
+        created_at=project.created_at,
+        endpoint_count=endpoint_count,
+    )
+
+
+def get_project(db: Session, project_id: int):
+    return db.query(models.Project).filter(models.Project.id == project_id).first()
+
+
+def get_project_by_slug(db: Session, url_slug: str):
+    return db.query(models.Project).filter(models.Project.url_slug == url_slug).first()
+
+
+def update_project(db: Session, project: models.Project, update: schemas.ProjectUpdate):
+    for field, value in update.model_dump(exclude_unset=True).items():
+        setattr(project, field, value)
+    db.commit()
+    publish_config_change(project_id=project.id, slug=project.url_slug)
+    endpoint_counts = _count_by(db, models.Endpoint.project_id, models.Endpoint.id, [project.id])
+    return project_summary(project, endpoint_counts.get(project.id, 0))
+
+
+def get_project_detail(db: Session, project_id: int):
+    """The project with endpoints and their responses, in three queries total."""
+    return db.query(models.Project) \
+        .options(selectinload(models.Project.endpoints).selectinload(models.Endpoint.responses)) \
+        .filter(models.Project.id == project_id) \
+        .first()
+
+
+def get_visible_project_ids(db: Session, user: models.User, project_slug: str | None = None) -> set:
+    """Ids of every project in the user's organizations, optionally just one slug."""
+    query = db.query(models.Project.id) \
+        .join(models.OrganizationMember,
+              models.OrganizationMember.organization_id == models.Project.organization_id) \
+        .filter(models.OrganizationMember.user_id == user.id)
+    if project_slug:
+        query = query.filter(models.Project.url_slug == project_slug)
+    return {project_id for (project_id,) in query.all()}
+
+
+# --- Stateful Mock Data ---
+# The mock engine keeps a project's collections under "{ns}{path}:*" and the
+# stored bytes per path (plus "#total") in the "{ns}usage" hash, where {ns}
+# is the current generation: "state:{project_id}:g{gen}:", or
+# "state:{project_id}:" for generation 0. "state:{project_id}:gen" holds gen.
+
+def get_state_footprint(project: models.Project) -> schemas.StateFootprint:
+    """Items, bytes and time to expiry of each of the project's collections."""
+    generation = int(redis_client.get(f"state:{project.id}:gen") or 0)
+    prefix = f"state:{project.id}:g{generation}:" if generation else f"state:{project.id}:"
+    usage = {field.decode(): int(value) for field, value in redis_client.hgetall(f"{prefix}usage").items()}
+    paths = sorted(path for path in usage if path.startswith("/"))
+    pipe = redis_client.pipeline(transaction=False)
+    for path in paths:
+        pipe.zcard(f"{prefix}{path}:order")
+        pipe.pttl(f"{prefix}{path}:items")
+    results = pipe.execute() if paths else []
+
+    collections = []
+    for path, items, ttl_ms in zip(paths, results[::2], results[1::2]):
+        if ttl_ms == -2:
+            continue  # expired since the engine last counted it
+        collections.append(schemas.StateCollection(
+            path=path,
+            items=items,
+            bytes=usage[path],
+            expires_in_s=-(-ttl_ms // 1000) if ttl_ms >= 0 else None,
+        ))
+    return schemas.StateFootprint(
+        project_id=project.id,
+        generation=generation,
+        total_bytes=sum(collection.bytes for collection in collections),
+        state_max_items=project.state_max_items,
+        state_max_bytes=project.state_max_bytes,
+        state_ttl_s=project.state_ttl_s,
+        collections=collections,
+    )
 
 
 # --- Endpoint/Response Functions ---
@@ -89,21 +312,108 @@ def create_endpoint(db: Session, project_id: int, endpoint: schemas.EndpointCrea
         project_id=project_id,
         method=endpoint.method,
         path=endpoint.path,
-        description=endpoint.description
+        description=endpoint.description,
+        selection=endpoint.selection,
+        responses=[models.Response(**response.model_dump()) for response in endpoint.all_responses()]
     )
     db.add(db_endpoint)
-    db.commit()
+    db.commit()  # endpoint and responses go in together
     db.refresh(db_endpoint)
+    publish_config_change(project_id=project_id)
+
+    return db_endpoint
 
-    db_response = models.Response(
-        endpoint_id=db_endpoint.id,
-        status_code=endpoint.response.status_code,
-        body=endpoint.response.body,
-        delay_ms=endpoint.response.delay_ms,  # <-- NEW
-        failure_rate=endpoint.response.failure_rate  # <-- NEW
+
+def import_endpoints(db: Session, project_id: int, endpoints: list) -> int:
+    """
+    Inserts many endpoints and their responses in one transaction and
+    publishes a single config change. Responses go in as one executemany.
+    """
+    db_endpoints = [
+        models.Endpoint(
+            project_id=project_id,
+            method=endpoint.method,
+            path=endpoint.path,
+            description=endpoint.description,
+            selection=endpoint.selection
+        )
+        for endpoint in endpoints
+    ]
+    db.add_all(db_endpoints)
+    db.flush()  # assigns the endpoint ids, nothing is committed yet
+
+    db.execute(insert(models.Response), [
+        {"endpoint_id": db_endpoint.id, **response.model_dump()}
+        for db_endpoint, endpoint in zip(db_endpoints, endpoints)
+        for response in endpoint.all_responses()
+    ])
+    db.commit()
+    publish_config_change(project_id=project_id)
+    return len(db_endpoints)
+
+
+CLONED_SETTINGS = ("faker_seed", "rate_limit_rps", "rate_limit_burst",
+                   "state_max_items", "state_max_bytes", "state_ttl_s")
+
+
+def clone_project(db: Session, source: models.Project, project: schemas.ProjectCreate):
+    """
+    Copies a project's endpoints and responses into a new project in the same
+    organization, entirely in SQL (INSERT ... SELECT), in one transaction.
+
+    Only the first endpoint per (method, path) is copied: it's the one the
+    mock engine serves, and it keeps the response join below one-to-one.
+    """
+    settings = project.model_dump()
+    for field in CLONED_SETTINGS:
+        # Unset settings are inherited, so the clone behaves like the source
+        if field not in project.model_fields_set:
+            settings[field] = getattr(source, field)
+    db_project = models.Project(**settings, organization_id=source.organization_id)
+    db.add(db_project)
+    db.flush()
+
+    Endpoint, Response = models.Endpoint, models.Response
+    served = select(func.min(Endpoint.id)) \
+        .where(Endpoint.project_id == source.id) \
+        .group_by(Endpoint.method, Endpoint.path)
+    db.execute(
+        insert(Endpoint).from_select(
+            ["project_id", "method", "path", "description", "selection"],
+            select(literal(db_project.id), Endpoint.method, Endpoint.path, Endpoint.description, Endpoint.selection)
+            .where(Endpoint.id.in_(served))
+            .order_by(Endpoint.id)
+        )
     )
+
+    old, new = aliased(Endpoint), aliased(Endpoint)
+    db.execute(
+        insert(Response).from_select(
+            ["endpoint_id", "status_code", "body", "delay_ms", "failure_rate", "stream_mode", "chunk_delay_ms",
+             "rule", "weight"],
+            select(new.id, Response.status_code, Response.body, Response.delay_ms, Response.failure_rate,
+                   Response.stream_mode, Response.chunk_delay_ms, Response.rule, Response.weight)
+            .join(old, Response.endpoint_id == old.id)
+            .join(new, and_(new.project_id == db_project.id, new.method == old.method, new.path == old.path))
+            .where(old.id.in_(served))
+            .order_by(Response.id)
+        )
+    )
+    db.commit()
+    publish_config_change(project_id=db_project.id, slug=db_project.url_slug)
+
+    endpoint_counts = _count_by(db, Endpoint.project_id, Endpoint.id, [db_project.id])
+    return project_summary(db_project, endpoint_counts.get(db_project.id, 0))
+
+
+def get_endpoint(db: Session, endpoint_id: int):
+    return db.query(models.Endpoint).filter(models.Endpoint.id == endpoint_id).first()
+
+
+def add_response(db: Session, endpoint: models.Endpoint, response: schemas.ResponseCreate):
+    db_response = models.Response(endpoint_id=endpoint.id, **response.model_dump())
     db.add(db_response)
     db.commit()
     db.refresh(db_response)
-
-    return db_endpoint
\ No newline at end of file
+    publish_config_change(project_id=endpoint.project_id)
+    return db_response
@@ -1,4 +1,6 @@
 import os
+import redis
+import redis.asyncio
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
@@ -9,4 +11,14 @@ engine = create_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# --- Redis Connection ---
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+redis_client = redis.Redis.from_url(REDIS_URL)
+# Used by the /ws/logs hub so subscribing never blocks the event loop
+async_redis_client = redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True)
+
+# The mock engine listens on this channel and drops its cached routes
+# for any project mentioned in a message.
+CONFIG_CHANNEL = "mockapi:config"
@@ -0,0 +1,35 @@
+import os
+import urllib.error
+import urllib.request
+
+# The mock engine's internal routes, reached with a token both services share
+ENGINE_URL = os.getenv("ENGINE_URL", "http://localhost:8001")
+ENGINE_INTERNAL_TOKEN = os.getenv("ENGINE_INTERNAL_TOKEN", "")
+ENGINE_TIMEOUT = float(os.getenv("ENGINE_TIMEOUT_S", "30"))
+
+
+class EngineUnavailable(Exception):
+    """The engine couldn't be reached, or the shared token isn't set."""
+
+
+def call_engine(method: str, path: str, body: bytes | None = None) -> tuple[int, bytes]:
+    """
+    Sends one request to the engine and returns (status, body), passing
+    error statuses through rather than raising. Blocking: call it from a
+    sync route so it runs in the threadpool.
+    """
+    if not ENGINE_INTERNAL_TOKEN:
+        raise EngineUnavailable("ENGINE_INTERNAL_TOKEN is not set")
+    request = urllib.request.Request(
+        ENGINE_URL.rstrip("/") + path,
+        data=body,
+        method=method,
+        headers={"X-Internal-Token": ENGINE_INTERNAL_TOKEN, "Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=ENGINE_TIMEOUT) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError as e:  # URLError, timeouts, refused connections
+        raise EngineUnavailable(str(e)) from e
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import re
+from collections import deque
+from .database import async_redis_client
+
+# The mock engine appends each project's request logs to "logs:{project_id}"
+LOG_STREAM_PREFIX = "logs:"
+# Records buffered per WebSocket before the oldest are dropped
+LOG_CLIENT_QUEUE_SIZE = int(os.getenv("LOG_CLIENT_QUEUE_SIZE", "500"))
+# Most records replayed to a client that connects with ?since=
+LOG_BACKFILL_LIMIT = int(os.getenv("LOG_BACKFILL_LIMIT", "500"))
+# How long one XREAD waits; also how quickly a newly watched stream is picked up
+LOG_TAIL_BLOCK_MS = int(os.getenv("LOG_TAIL_BLOCK_MS", "500"))
+LOG_TAIL_COUNT = int(os.getenv("LOG_TAIL_COUNT", "1000"))
+
+STREAM_ID_PATTERN = re.compile(r"^\d+(-\d+)?$")
+
+
+def parse_stream_id(entry_id: str) -> tuple:
+    """'1700000000000-3' -> (1700000000000, 3), for ordering ids."""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def format_entry(entry_id: str, fields: dict) -> str:
+    """One WebSocket frame: the logged record plus its stream id."""
+    record = json.loads(fields["data"])
+    record["id"] = entry_id
+    return json.dumps(record)
+
+
+class LogSubscription:
+    """One WebSocket's view of the log streams, limited to the projects it may see."""
+
+    def __init__(self, project_ids: set, maxsize: int = LOG_CLIENT_QUEUE_SIZE):
+        self.project_ids = project_ids
+        self._buffer = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        # project_id -> newest id already sent by backfill; live copies are skipped
+        self.sent_up_to = {}
+        self.dropped = 0
+
+    def push(self, project_id: int, entry_id: tuple, text: str):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1  # deque drops the oldest record for us
+        self._buffer.append((project_id, entry_id, text))
+        self._ready.set()
+
+    async def next_batch(self) -> list:
+        """Waits for and returns everything buffered so far."""
+        while True:
+            while not self._buffer:
+                self._ready.clear()
+                await self._ready.wait()
+            batch = [text for project_id, entry_id, text in self._buffer
+                     if entry_id > self.sent_up_to.get(project_id, (-1, -1))]
+            self._buffer.clear()
+            if batch:
+                return batch
+
+
+class LogHub:
+    """
+    One stream reader per manager-api process, fanned out in memory to every
+    connected dashboard. A single XREAD tails the streams of every watched
+    project, and each entry is only offered to the clients allowed to see it.
+    """
+
+    def __init__(self):
+        self._by_project = {}  # project_id -> set of LogSubscription
+        self._last_ids = {}    # project_id -> last stream id read, for watched projects
+        self._watching = asyncio.Event()
+        self._task = None
+
+    async def subscribe(self, project_ids: set) -> LogSubscription:
+        subscription = LogSubscription(project_ids)
+        for project_id in project_ids:
+            if project_id not in self._last_ids:
+                # Start tailing from the current end; anything older is backfill.
+                newest = await async_redis_client.xrevrange(f"{LOG_STREAM_PREFIX}{project_id}", count=1)
+                self._last_ids.setdefault(project_id, newest[0][0] if newest else "0-0")
+            self._by_project.setdefault(project_id, set()).add(subscription)
+        self._watching.set()
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription):
+        for project_id in subscription.project_ids:
+            clients = self._by_project.get(project_id)
+            if clients is not None:
+                clients.discard(subscription)
+                if not clients:
+                    del self._by_project[project_id]
+                    self._last_ids.pop(project_id, None)
+
+    async def backfill(self, subscription: LogSubscription, since: str) -> list:
+        """
+        Records newer than `since` across the subscription's projects, oldest
+        first and capped at LOG_BACKFILL_LIMIT (the newest ones win).
+        """
+        if not STREAM_ID_PATTERN.match(since):
+            since = "0"
+        entries = []
+        for project_id in subscription.project_ids:
+            found = await async_redis_client.xrevrange(
+                f"{LOG_STREAM_PREFIX}{project_id}", max="+", min=f"({since}", count=LOG_BACKFILL_LIMIT
+            )
+            if found:
+                subscription.sent_up_to[project_id] = parse_stream_id(found[0][0])
+            entries.extend((parse_stream_id(entry_id), entry_id, fields) for entry_id, fields in found)
+        entries.sort(key=lambda entry: entry[0])
+        return [format_entry(entry_id, fields) for _, entry_id, fields in entries[-LOG_BACKFILL_LIMIT:]]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def dispatch(self, project_id: int, entries: list):
+        clients = self._by_project.get(project_id)
+        if not clients:
+            return
+        for entry_id, fields in entries:
+            text = format_entry(entry_id, fields)
+            parsed_id = parse_stream_id(entry_id)
+            for subscription in clients:
+                subscription.push(project_id, parsed_id, text)
+
+    async def _run(self):
+        while True:
+            if not self._last_ids:
+                self._watching.clear()
+                await self._watching.wait()
+                continue
+            streams = {f"{LOG_STREAM_PREFIX}{project_id}": last_id
+                       for project_id, last_id in self._last_ids.items()}
+            try:
+                response = await async_redis_client.xread(streams, count=LOG_TAIL_COUNT, block=LOG_TAIL_BLOCK_MS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Log hub lost Redis connection: {e}")
+                await asyncio.sleep(1)
+                continue
+            for key, entries in response or []:
+                project_id = int(key[len(LOG_STREAM_PREFIX):])
+                if project_id not in self._last_ids or not entries:
+                    continue
+                self._last_ids[project_id] = entries[-1][0]
+                self.dispatch(project_id, entries)
+
+
+log_hub = LogHub()
@@ -1,19 +1,21 @@
-from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect  # <-- CORRECTED IMPORT
+from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Query, Response, Body  # <-- CORRECTED IMPORT
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import Annotated, List
+from typing import Annotated, Any, Dict, List
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
+import json
 import redis
-import os
+import time
 from asyncio import to_thread  # <-- Ensure to_thread is available
 
-from . import models, schemas, crud, auth
+from . import models, schemas, crud, auth, openapi_import
+from .engine_client import call_engine, EngineUnavailable
 from .database import SessionLocal, engine
-
-# --- REDIS SETUP (For Pub/Sub) ---
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
-redis_client = redis.Redis.from_url(REDIS_URL)
+from .log_hub import log_hub
+from .cache import token_cache, role_cache
+from .pagination import LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE, decode_cursor, page_rows
 
 # This creates the tables
 models.Base.metadata.create_all(bind=engine)
@@ -28,6 +30,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -50,8 +53,13 @@ def get_current_user(
 ):
     """
     Decodes the token, gets the email, and returns the User object
-    from the database.
+    from the database. Verified tokens are cached, so repeat calls
+    skip both the JWT decode and the user query.
     """
+    snapshot = token_cache.get(token, None)
+    if snapshot is not None:
+        return crud.user_from_snapshot(db, snapshot)
+
     token_data = auth.decode_access_token(token)
     user = crud.get_user_by_email(db, email=token_data.email)
     if user is None:
@@ -60,6 +68,9 @@ def get_current_user(
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Never cache a token past its own expiry
+    ttl = token_data.expires_at - time.time() if token_data.expires_at else None
+    token_cache.set(token, crud.user_snapshot(user), ttl=ttl)
     return user
 
 
@@ -69,38 +80,68 @@ user_dependency = Annotated[models.User, Depends(get_current_user)]
 @app.on_event("startup")
 async def startup():
     print("Manager API starting up and connecting to DB...")
+    log_hub.start()
 
 
-# --- NEW: WEB SOCKET LOGS ENDPOINT ---
+@app.on_event("shutdown")
+async def shutdown():
+    await log_hub.stop()
+    auth.shutdown_hashing()
 
-def get_redis_pubsub():
-    """Returns the Redis PubSub object for listening."""
-    return redis_client.pubsub()
 
+# --- NEW: WEB SOCKET LOGS ENDPOINT ---
 
-async def redis_consumer(websocket: WebSocket):
-    """Subscribes to Redis and sends messages to the WebSocket client."""
+def get_log_scope(token: str, project_slug: str | None) -> set:
+    """Resolves the WebSocket's token to the project ids it may watch."""
+    db = SessionLocal()
+    try:
+        token_data = auth.decode_access_token(token)
+        user = crud.get_user_by_email(db, email=token_data.email)
+        if user is None:
+            return set()
+        return crud.get_visible_project_ids(db, user=user, project_slug=project_slug)
+    except HTTPException:
+        return set()
+    finally:
+        db.close()
 
-    pubsub = await to_thread(get_redis_pubsub)
-    await to_thread(pubsub.subscribe, 'mockapi:logs')
 
+async def send_logs(websocket: WebSocket, subscription, since: str | None):
+    """Replays history after `since` (if given), then forwards live records."""
     try:
-        # Get messages from the synchronous listener in a non-blocking way
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                await websocket.send_text(message['data'].decode('utf-8'))
-    finally:
-        # Ensure cleanup happens if the loop breaks
-        await to_thread(pubsub.unsubscribe, 'mockapi:logs')
-        await to_thread(pubsub.close)
+        if since is not None:
+            for text in await log_hub.backfill(subscription, since):
+                await websocket.send_text(text)
+        while True:
+            for text in await subscription.next_batch():
+                await websocket.send_text(text)
+    except Exception as e:
+        # Don't leave the client connected to a feed that has stopped
+        print(f"Log stream to client failed: {e}")
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
 
 
 @app.websocket("/ws/logs")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+        websocket: WebSocket,
+        token: str = "",
+        project_slug: str | None = None,
+        since: str | None = None
+):
+    # Browsers can't set headers on WebSockets, so the JWT comes in the query string.
+    # ?since=<stream id> replays what the client missed (since=0: recent history).
+    project_ids = await to_thread(get_log_scope, token, project_slug)
+    if not project_ids:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     await websocket.accept()
+    # Subscribe before backfilling so nothing falls in the gap; the
+    # subscription skips live copies of records the backfill already sent.
+    subscription = await log_hub.subscribe(project_ids)
 
-    # We create a task for the listener, so the main connection handler can stay alive
-    listener_task = asyncio.create_task(redis_consumer(websocket))
+    # We create a task for the sender, so the main connection handler can stay alive
+    sender_task = asyncio.create_task(send_logs(websocket, subscription, since))
 
     try:
         # Keep the connection alive until the client closes it
@@ -115,10 +156,8 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
     finally:
-        # Cancel the listener task when the WebSocket disconnects
-        listener_task.cancel()
-        # Ensure the connection is closed
-        await websocket.close()
+        log_hub.unsubscribe(subscription)
+        sender_task.cancel()
 
 
 @app.get("/")
@@ -127,29 +166,37 @@ def read_root():
 
 
 # --- Auth Endpoints (remaining endpoints are the same) ---
+# These two are async so bcrypt runs on the hashing pool (see auth.run_hashing)
+# instead of tying up threadpool threads; their DB calls still go to the threadpool.
 @app.post("/users/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: db_dependency):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def create_user(user: schemas.UserCreate, db: db_dependency):
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    return crud.create_user(db=db, user=user)
+    hashed_password = await auth.hash_password(user.password)
+    return await run_in_threadpool(crud.create_user, db=db, user=user, hashed_password=hashed_password)
 
 
 @app.post("/token", response_model=schemas.Token)
-def login_for_access_token(
+async def login_for_access_token(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
         db: db_dependency
 ):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await run_in_threadpool(crud.get_user_by_email, db, email=form_data.username)
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await auth.verify_password_async(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        await run_in_threadpool(crud.update_password_hash, db, user, new_hash)
 
     access_token = auth.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -160,21 +207,191 @@ def read_users_me(current_user: user_dependency):
     return current_user
 
 
+@app.get("/cache/stats")
+def read_cache_stats(current_user: user_dependency):
+    """Hit rates for the identity caches behind get_current_user and get_user_role."""
+    return {"tokens": token_cache.stats(), "roles": role_cache.stats()}
+
+
 @app.post("/organizations", response_model=schemas.Organization, status_code=status.HTTP_201_CREATED)
 def create_organization(
         org: schemas.OrganizationCreate,
         current_user: user_dependency,
         db: db_dependency
 ):
-    return crud.create_organization(db=db, org=org, user=current_user)
+    db_org = crud.create_organization(db=db, org=org, user=current_user)
+    return crud.get_organization_detail(db, org_id=db_org.id, role=models.Role.owner)
+
 
+# Listing routes page with ?limit= and an opaque ?cursor=; the cursor for the
+# next page, if any, is returned in the X-Next-Cursor header.
+page_limit = Annotated[int, Query(ge=1, le=LIST_MAX_PAGE_SIZE)]
 
-@app.get("/organizations", response_model=List[schemas.Organization])
+
+@app.get("/organizations", response_model=List[schemas.OrganizationSummary])
 def read_user_organizations(
+        response: Response,
+        current_user: user_dependency,
+        db: db_dependency,
+        limit: page_limit = LIST_PAGE_SIZE,
+        cursor: str | None = None
+):
+    orgs = crud.get_user_organizations(db=db, user=current_user, after_id=decode_cursor(cursor), limit=limit)
+    orgs, next_cursor = page_rows(orgs, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return orgs
+
+
+def require_member(db: Session, user: models.User, org_id: int):
+    """Returns the user's role in the org, or 404s so non-members can't probe ids."""
+    role = crud.get_user_role(db, user_id=user.id, org_id=org_id)
+    if role is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Organization not found")
+    return role
+
+
+@app.get("/organizations/{org_id}", response_model=schemas.Organization)
+def read_organization(
+        org_id: int,
+        current_user: user_dependency,
+        db: db_dependency
+):
+    role = require_member(db, current_user, org_id)
+    return crud.get_organization_detail(db, org_id=org_id, role=role)
+
+
+@app.patch("/organizations/{org_id}", response_model=schemas.Organization)
+def update_organization(
+        org_id: int,
+        update: schemas.OrganizationUpdate,
         current_user: user_dependency,
         db: db_dependency
 ):
-    return crud.get_user_organizations(db=db, user=current_user)
+    role = require_member(db, current_user, org_id)
+    if role not in [models.Role.owner, models.Role.admin]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be an Owner or Admin to change the organization"
+        )
+    return crud.update_organization(db, org_id=org_id, update=update, role=role)
+
+
+@app.get("/organizations/{org_id}/projects", response_model=List[schemas.ProjectSummary])
+def read_organization_projects(
+        org_id: int,
+        response: Response,
+        current_user: user_dependency,
+        db: db_dependency,
+        limit: page_limit = LIST_PAGE_SIZE,
+        cursor: str | None = None
+):
+    require_member(db, current_user, org_id)
+    projects = crud.get_organization_projects(db, org_id=org_id, after_id=decode_cursor(cursor), limit=limit)
+    projects, next_cursor = page_rows(projects, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return projects
+
+
+@app.get("/projects/{project_id}", response_model=schemas.Project)
+def read_project(
+        project_id: int,
+        current_user: user_dependency,
+        db: db_dependency
+):
+    project = crud.get_project_detail(db, project_id=project_id)
+    if not project or crud.get_user_role(db, user_id=current_user.id, org_id=project.organization_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project
+
+
+@app.get("/projects/{project_id}/state", response_model=schemas.StateFootprint)
+def read_project_state(
+        project_id: int,
+        current_user: user_dependency,
+        db: db_dependency
+):
+    """How much stateful-mock data the project holds right now."""
+    project = crud.get_project(db, project_id=project_id)
+    if not project or crud.get_user_role(db, user_id=current_user.id, org_id=project.organization_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    try:
+        return crud.get_state_footprint(project)
+    except redis.RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="State store unavailable")
+
+
+def forward_state_request(method: str, project: models.Project, path: str, body: bytes | None = None) -> Response:
+    """Relays a state request to the engine, which owns the state scripts."""
+    try:
+        code, content = call_engine(method, f"/internal/state/{project.url_slug}{path}", body)
+    except EngineUnavailable as e:
+        print(f"State request for project {project.id} failed: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Mock engine unavailable")
+    return Response(content=content, status_code=code, media_type="application/json")
+
+
+@app.post("/projects/{project_id}/state/reset")
+def reset_project_state(
+        project_id: int,
+        current_user: user_dependency,
+        db: db_dependency,
+        snapshot: Annotated[Dict[str, Any] | None, Body()] = None
+):
+    """
+    Empties the project's stateful data in constant time, or replaces it
+    with a snapshot: {"collections": {"/users": [...], ...}}.
+    """
+    project = crud.get_project(db, project_id=project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    role = crud.get_user_role(db, user_id=current_user.id, org_id=project.organization_id)
+    if role is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if role not in [models.Role.owner, models.Role.admin]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be an Owner or Admin to reset project state"
+        )
+    body = json.dumps(snapshot).encode() if snapshot is not None else None
+    return forward_state_request("POST", project, "/reset", body)
+
+
+@app.get("/projects/{project_id}/state/export")
+def export_project_state(
+        project_id: int,
+        current_user: user_dependency,
+        db: db_dependency
+):
+    """The project's stateful data as a snapshot that /state/reset accepts."""
+    project = crud.get_project(db, project_id=project_id)
+    if not project or crud.get_user_role(db, user_id=current_user.id, org_id=project.organization_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return forward_state_request("GET", project, "")
+
+
+@app.patch("/projects/{project_id}", response_model=schemas.ProjectSummary)
+def update_project(
+        project_id: int,
+        update: schemas.ProjectUpdate,
+        current_user: user_dependency,
+        db: db_dependency
+):
+    project = crud.get_project(db, project_id=project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    role = crud.get_user_role(db, user_id=current_user.id, org_id=project.organization_id)
+    if role is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if role not in [models.Role.owner, models.Role.admin]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be an Owner or Admin to change projects"
+        )
+    return crud.update_project(db, project=project, update=update)
 
 
 @app.post("/organizations/{org_id}/invite", response_model=schemas.Member)
@@ -233,7 +450,31 @@ def create_endpoint_for_project(
         current_user: user_dependency,
         db: db_dependency
 ):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    project = crud.get_project(db, project_id=project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    role = crud.get_user_role(db, user_id=current_user.id, org_id=project.organization_id)
+    if role not in [models.Role.owner, models.Role.admin]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be an Owner or Admin to create endpoints"
+        )
+    return crud.create_endpoint(db=db, project_id=project_id, endpoint=endpoint)
+
+@app.post("/projects/{project_id}/endpoints/import", response_model=schemas.EndpointImportResult,
+          status_code=status.HTTP_201_CREATED)
+def import_endpoints_for_project(
+        project_id: int,
+        payload: Annotated[List[schemas.EndpointCreate] | Dict[str, Any], Body()],
+        current_user: user_dependency,
+        db: db_dependency
+):
+    """
+    Bulk-creates endpoints from an OpenAPI (3.x or Swagger 2) document or a
+    JSON array of endpoint definitions, all in one transaction.
+    """
+    project = crud.get_project(db, project_id=project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
@@ -243,4 +484,54 @@ def create_endpoint_for_project(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You must be an Owner or Admin to create endpoints"
         )
-    return crud.create_endpoint(db=db, project_id=project_id, endpoint=endpoint)
\ No newline at end of file
+    endpoints = openapi_import.parse_import(payload)
+    imported = crud.import_endpoints(db, project_id=project_id, endpoints=endpoints)
+    return schemas.EndpointImportResult(project_id=project_id, imported=imported)
+
+
+@app.post("/projects/{project_id}/clone", response_model=schemas.ProjectSummary, status_code=status.HTTP_201_CREATED)
+def clone_project(
+        project_id: int,
+        project: schemas.ProjectCreate,
+        current_user: user_dependency,
+        db: db_dependency
+):
+    """Copies a project's endpoints into a new project in the same organization."""
+    source = crud.get_project(db, project_id=project_id)
+    if not source:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    role = crud.get_user_role(db, user_id=current_user.id, org_id=source.organization_id)
+    if role not in [models.Role.owner, models.Role.admin]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be an Owner or Admin to create projects"
+        )
+    if crud.get_project_by_slug(db, url_slug=project.url_slug):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A project with this URL slug already exists"
+        )
+    return crud.clone_project(db, source=source, project=project)
+
+
+@app.post("/endpoints/{endpoint_id}/responses", response_model=schemas.Response, status_code=status.HTTP_201_CREATED)
+def add_response_to_endpoint(
+        endpoint_id: int,
+        response: schemas.ResponseCreate,
+        current_user: user_dependency,
+        db: db_dependency
+):
+    """Adds another response (e.g. a rule-based variant) to an endpoint."""
+    endpoint = crud.get_endpoint(db, endpoint_id=endpoint_id)
+    project = crud.get_project(db, project_id=endpoint.project_id) if endpoint else None
+    if not project:
+        raise HTTPException(status_code=404, detail="Endpoint not found")
+
+    role = crud.get_user_role(db, user_id=current_user.id, org_id=project.organization_id)
+    if role not in [models.Role.owner, models.Role.admin]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You must be an Owner or Admin to create endpoints"
+        )
+    return crud.add_response(db, endpoint=endpoint, response=response)
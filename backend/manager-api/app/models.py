@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Text, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Text, Float, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -30,6 +30,9 @@ class Organization(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
+    # Requests per second across all of the org's mocks (NULL = unlimited)
+    rate_limit_rps = Column(Float)
+    rate_limit_burst = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     members = relationship("OrganizationMember", back_populates="organization")
@@ -43,6 +46,17 @@ class Project(Base):
     name = Column(String(255), nullable=False)
     url_slug = Column(String(255), unique=True, index=True, nullable=False)
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    # Set to make every Faker value in this project's mocks reproducible
+    faker_seed = Column(String(64))
+    # Requests per second to this project's mocks (NULL = unlimited);
+    # burst defaults to one second's worth
+    rate_limit_rps = Column(Float)
+    rate_limit_burst = Column(Integer)
+    # Stateful-mock limits (NULL = the mock engine's defaults): items kept
+    # per collection, total stored bytes, and idle expiry in seconds
+    state_max_items = Column(Integer)
+    state_max_bytes = Column(Integer)
+    state_ttl_s = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     organization = relationship("Organization", back_populates="projects")
@@ -73,6 +87,18 @@ class HttpMethod(enum.Enum):
     HEAD = "HEAD"
 
 
+class SelectionMode(enum.Enum):
+    first = "first"
+    weighted = "weighted"
+    round_robin = "round_robin"
+
+
+class StreamMode(enum.Enum):
+    json_array = "json_array"
+    ndjson = "ndjson"
+    sse = "sse"
+
+
 class Endpoint(Base):
     __tablename__ = "endpoints"
 
@@ -82,6 +108,8 @@ class Endpoint(Base):
     method = Column(Enum(HttpMethod), nullable=False)
     path = Column(String(2048), nullable=False)
     description = Column(String(500))
+    # Picks among responses without a rule (see Response.rule)
+    selection = Column(Enum(SelectionMode), default=SelectionMode.first)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     project = relationship("Project", back_populates="endpoints")
@@ -101,4 +129,15 @@ class Response(Base):
     delay_ms = Column(Integer, default=0)
     failure_rate = Column(Float, default=0.0)
 
+    # --- STREAMING COLUMNS ---
+    # NULL sends the body in one piece
+    stream_mode = Column(Enum(StreamMode))
+    chunk_delay_ms = Column(Integer, default=0)
+
+    # --- SELECTION COLUMNS ---
+    # e.g. {"query": {"status": "active"}, "headers": {"X-Scenario": "error"}};
+    # responses with a matching rule are served before any without one
+    rule = Column(JSON)
+    weight = Column(Integer, default=1)
+
     endpoint = relationship("Endpoint", back_populates="responses")
\ No newline at end of file
@@ -0,0 +1,161 @@
+import json
+import os
+from fastapi import HTTPException, status
+from . import schemas
+from .models import HttpMethod
+
+# Upper bound on endpoints accepted by one import request
+IMPORT_MAX_ENDPOINTS = int(os.getenv("IMPORT_MAX_ENDPOINTS", "5000"))
+
+# How deep $ref chains and nested schemas are followed when building bodies
+MAX_SCHEMA_DEPTH = 8
+
+# Faker tags used for schema types when an operation has no example
+STRING_FORMATS = {
+    "email": "{{Faker.email()}}",
+    "date": "{{Faker.date()}}",
+    "date-time": "{{Faker.iso8601()}}",
+    "uuid": "{{Faker.uuid4()}}",
+    "uri": "{{Faker.url()}}",
+    "url": "{{Faker.url()}}",
+    "hostname": "{{Faker.hostname()}}",
+    "ipv4": "{{Faker.ipv4()}}",
+    "ipv6": "{{Faker.ipv6()}}",
+}
+TYPE_TAGS = {
+    "string": "{{Faker.word()}}",
+    "integer": "{{Faker.random_int()}}",
+    "number": "{{Faker.pyfloat()}}",
+    "boolean": "{{Faker.pybool()}}",
+}
+
+
+def bad_import(detail: str):
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def resolve_ref(document: dict, ref: str):
+    """Follows a local JSON pointer such as '#/components/schemas/User'."""
+    if not ref.startswith("#/"):
+        return {}  # external refs aren't fetched
+    node = document
+    for part in ref[2:].split("/"):
+        part = part.replace("~1", "/").replace("~0", "~")
+        if not isinstance(node, dict) or part not in node:
+            return {}
+        node = node[part]
+    return node
+
+
+def example_from_schema(document: dict, schema, depth: int = 0):
+    """A JSON value shaped like the schema, with Faker tags as leaf values."""
+    if not isinstance(schema, dict) or depth > MAX_SCHEMA_DEPTH:
+        return None
+    if "$ref" in schema:
+        return example_from_schema(document, resolve_ref(document, schema["$ref"]), depth + 1)
+    if "example" in schema:
+        return schema["example"]
+    if schema.get("enum"):
+        return schema["enum"][0]
+    for combinator in ("allOf", "oneOf", "anyOf"):
+        if schema.get(combinator):
+            if combinator != "allOf":
+                return example_from_schema(document, schema[combinator][0], depth + 1)
+            merged = {}
+            for part in schema["allOf"]:
+                value = example_from_schema(document, part, depth + 1)
+                if isinstance(value, dict):
+                    merged.update(value)
+            return merged
+
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):  # OpenAPI 3.1, e.g. ["string", "null"]
+        schema_type = next((t for t in schema_type if t != "null"), None)
+    if schema_type == "array":
+        return [example_from_schema(document, schema.get("items", {}), depth + 1)]
+    if schema_type == "object" or "properties" in schema:
+        return {
+            name: example_from_schema(document, prop, depth + 1)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if schema_type == "string":
+        return STRING_FORMATS.get(schema.get("format"), TYPE_TAGS["string"])
+    return TYPE_TAGS.get(schema_type)
+
+
+def pick_response(responses: dict):
+    """The first 2xx response (in code order), falling back to 'default'."""
+    codes = sorted(code for code in responses if str(code).isdigit() and str(code).startswith("2"))
+    if codes:
+        return int(codes[0]), responses[codes[0]]
+    if "default" in responses:
+        return 200, responses["default"]
+    return 200, {}
+
+
+def response_body(document: dict, response: dict):
+    """Example body for one response object (OpenAPI 3 or Swagger 2)."""
+    if "$ref" in response:
+        response = resolve_ref(document, response["$ref"])
+    content = response.get("content") or {}
+    media = content.get("application/json") or next(iter(content.values()), None)
+    if media is not None:
+        if "example" in media:
+            return media["example"]
+        for example in (media.get("examples") or {}).values():
+            if "$ref" in example:
+                example = resolve_ref(document, example["$ref"])
+            if "value" in example:
+                return example["value"]
+        return example_from_schema(document, media.get("schema"))
+
+    # Swagger 2.0 keeps these on the response itself
+    examples = response.get("examples") or {}
+    if "application/json" in examples:
+        return examples["application/json"]
+    return example_from_schema(document, response.get("schema"))
+
+
+def endpoints_from_openapi(document: dict) -> list:
+    """
+    One EndpointCreate per operation in the document's paths. Path
+    templates like /users/{id} are kept as-is; the mock engine matches them.
+    """
+    paths = document.get("paths")
+    if not isinstance(paths, dict):
+        raise bad_import("Expected an OpenAPI document with 'paths' or a list of endpoints")
+
+    methods = {method.value.lower(): method for method in HttpMethod}
+    endpoints = []
+    for path, path_item in paths.items():
+        if not isinstance(path_item, dict):
+            continue
+        if "$ref" in path_item:
+            path_item = resolve_ref(document, path_item["$ref"])
+        for key, operation in path_item.items():
+            if key not in methods or not isinstance(operation, dict):
+                continue
+            status_code, response = pick_response(operation.get("responses") or {})
+            body = response_body(document, response)
+            description = operation.get("summary") or operation.get("description") or operation.get("operationId")
+            endpoints.append(schemas.EndpointCreate(
+                method=methods[key],
+                path=path,
+                description=description[:500] if description else None,
+                response=schemas.ResponseCreate(
+                    status_code=status_code,
+                    body=json.dumps(body) if body is not None else None,
+                ),
+            ))
+    return endpoints
+
+
+def parse_import(payload) -> list:
+    """Accepts an OpenAPI/Swagger document or a list of endpoint definitions."""
+    endpoints = endpoints_from_openapi(payload) if isinstance(payload, dict) else list(payload)
+
+    if not endpoints:
+        raise bad_import("Nothing to import")
+    if len(endpoints) > IMPORT_MAX_ENDPOINTS:
+        raise bad_import(f"At most {IMPORT_MAX_ENDPOINTS} endpoints can be imported at once")
+    return endpoints
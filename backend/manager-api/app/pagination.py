@@ -0,0 +1,38 @@
+import base64
+import os
+from fastapi import HTTPException, status
+
+# Listing routes return at most this many rows per page
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "200"))
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque keyset cursor: the next page starts after this row id."""
+    return base64.urlsafe_b64encode(f"k:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> int:
+    """Returns the id to continue after; 0 for the first page."""
+    if not cursor:
+        return 0
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        kind, _, value = base64.urlsafe_b64decode(padded).decode().partition(":")
+        last_id = int(value)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if kind != "k" or last_id < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return last_id
+
+
+def page_rows(rows: list, limit: int):
+    """
+    Callers fetch limit + 1 rows; the extra one only tells us there is a
+    next page. Returns (rows, next_cursor).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].id)
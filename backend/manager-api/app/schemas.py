@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
 from datetime import datetime
-from .models import Role, HttpMethod
-from typing import List
+from .models import Role, HttpMethod, StreamMode, SelectionMode
+from typing import Dict, List, Literal
 
 
 # --- Token Schemas ---
@@ -12,6 +12,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: str | None = None
+    expires_at: float | None = None  # unix time, from the "exp" claim
 
 
 # --- User Schemas ---
@@ -36,18 +37,54 @@ class User(UserBase):
 class ProjectBase(BaseModel):
     name: str
     url_slug: str
+    # Makes the project's Faker values reproducible (e.g. for snapshot tests)
+    faker_seed: str | None = Field(default=None, max_length=64)
+    rate_limit_rps: float | None = Field(default=None, gt=0)
+    rate_limit_burst: int | None = Field(default=None, ge=1)
+    # Stateful-mock limits; unset means the engine's defaults, 0 means no limit
+    state_max_items: int | None = Field(default=None, ge=0)
+    state_max_bytes: int | None = Field(default=None, ge=0)
+    state_ttl_s: int | None = Field(default=None, ge=0)
 
 
 class ProjectCreate(ProjectBase):
     pass
 
 
+class ProjectUpdate(BaseModel):
+    """PATCH body: only the fields that are sent are changed."""
+    name: str | None = None
+    faker_seed: str | None = Field(default=None, max_length=64)
+    rate_limit_rps: float | None = Field(default=None, gt=0)
+    rate_limit_burst: int | None = Field(default=None, ge=1)
+    state_max_items: int | None = Field(default=None, ge=0)
+    state_max_bytes: int | None = Field(default=None, ge=0)
+    state_ttl_s: int | None = Field(default=None, ge=0)
+
+    @field_validator("name")
+    @classmethod
+    def name_not_null(cls, name):
+        # Omit it to keep the current name; null would break the NOT NULL column
+        if name is None:
+            raise ValueError("name cannot be null")
+        return name
+
+
 # --- Response Schemas (Define BEFORE Endpoint) ---
+RuleValue = str | int | float | bool | List[str | int | float | bool]
+
+
 class ResponseBase(BaseModel):
     status_code: int = 200
     body: str | None = None
     delay_ms: int = 0  # <-- NEW
     failure_rate: float = 0.0  # <-- NEW
+    stream_mode: StreamMode | None = None  # json_array, ndjson or sse
+    chunk_delay_ms: int = 0
+    # Serve this response only to matching requests, e.g.
+    # {"query": {"status": "active"}, "body": {"user.role": ["admin", "owner"]}}
+    rule: Dict[Literal["query", "headers", "params", "body"], Dict[str, RuleValue]] | None = None
+    weight: int = Field(default=1, ge=0)  # for weighted selection
 
 
 class ResponseCreate(ResponseBase):
@@ -67,10 +104,22 @@ class EndpointBase(BaseModel):
     method: HttpMethod
     path: str
     description: str | None = None
+    selection: SelectionMode = SelectionMode.first
 
 
 class EndpointCreate(EndpointBase):
-    response: ResponseCreate
+    response: ResponseCreate | None = None
+    # Further responses, e.g. rule-based variants
+    responses: List[ResponseCreate] = []
+
+    @model_validator(mode="after")
+    def require_response(self):
+        if self.response is None and not self.responses:
+            raise ValueError("An endpoint needs at least one response")
+        return self
+
+    def all_responses(self) -> List[ResponseCreate]:
+        return ([self.response] if self.response else []) + self.responses
 
 
 class Endpoint(EndpointBase):
@@ -82,7 +131,23 @@ class Endpoint(EndpointBase):
         from_attributes = True
 
 
+class EndpointImportResult(BaseModel):
+    project_id: int
+    imported: int
+
+
 # --- Update Project Schema ---
+class ProjectSummary(ProjectBase):
+    """Listing shape: no nested endpoints."""
+    id: int
+    organization_id: int
+    created_at: datetime
+    endpoint_count: int = 0
+
+    class Config:
+        from_attributes = True
+
+
 class Project(ProjectBase):
     id: int
     organization_id: int
@@ -93,6 +158,24 @@ class Project(ProjectBase):
         from_attributes = True
 
 
+class StateCollection(BaseModel):
+    path: str
+    items: int
+    bytes: int
+    expires_in_s: int | None = None  # None: no expiry
+
+
+class StateFootprint(BaseModel):
+    """A project's stateful-mock data as currently held in Redis."""
+    project_id: int
+    generation: int = 0  # bumped by every reset
+    total_bytes: int
+    state_max_items: int | None = None
+    state_max_bytes: int | None = None
+    state_ttl_s: int | None = None
+    collections: List[StateCollection] = []
+
+
 # --- Member Schemas ---
 class MemberInvite(BaseModel):
     email: EmailStr
@@ -110,17 +193,41 @@ class Member(BaseModel):
 # --- Organization Schemas ---
 class OrganizationBase(BaseModel):
     name: str
+    # Shared by all of the organization's projects
+    rate_limit_rps: float | None = Field(default=None, gt=0)
+    rate_limit_burst: int | None = Field(default=None, ge=1)
 
 
 class OrganizationCreate(OrganizationBase):
     pass
 
 
-class Organization(OrganizationBase):
+class OrganizationUpdate(BaseModel):
+    """PATCH body: only the fields that are sent are changed."""
+    name: str | None = None
+    rate_limit_rps: float | None = Field(default=None, gt=0)
+    rate_limit_burst: int | None = Field(default=None, ge=1)
+
+    @field_validator("name")
+    @classmethod
+    def name_not_null(cls, name):
+        if name is None:
+            raise ValueError("name cannot be null")
+        return name
+
+
+class OrganizationSummary(OrganizationBase):
+    """Listing shape: counts instead of nested projects and members."""
     id: int
     created_at: datetime
-    projects: List[Project] = []
-    members: List[Member] = []
+    role: Role | None = None  # the current user's role
+    project_count: int = 0
+    member_count: int = 0
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class Organization(OrganizationSummary):
+    """Detail shape; projects are listed separately with pagination."""
+    members: List[Member] = []
\ No newline at end of file
@@ -0,0 +1,155 @@
+import asyncio
+import base64
+import os
+import threading
+import time
+import orjson
+
+# Set to a file path to record incoming mock traffic for `python -m app.replay`
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "")
+# Capturing stops once the file reaches this size; 0 means no limit
+CAPTURE_MAX_BYTES = int(float(os.getenv("CAPTURE_MAX_MB", "1024")) * 1024 * 1024)
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "10000"))
+CAPTURE_BATCH_SIZE = int(os.getenv("CAPTURE_BATCH_SIZE", "1000"))
+
+# Set by the client/transport, not by what the frontend sent
+SKIPPED_HEADERS = frozenset({"host", "content-length", "transfer-encoding", "connection"})
+# Credentials are never written to disk; the header is kept so replays
+# still send it, with this value instead.
+REDACTED = "[redacted]"
+SENSITIVE_HEADERS = frozenset({
+    "authorization", "proxy-authorization", "cookie", "set-cookie",
+    "x-api-key", "api-key", "x-auth-token", "x-access-token", "x-csrf-token", "x-xsrf-token",
+})
+# Extra header names to redact, comma-separated
+CAPTURE_REDACT_HEADERS = frozenset(
+    name.strip().lower() for name in os.getenv("CAPTURE_REDACT_HEADERS", "").split(",") if name.strip()
+)
+
+
+def captured_header(name: str, value: str) -> str:
+    if name in SENSITIVE_HEADERS or name in CAPTURE_REDACT_HEADERS:
+        return REDACTED
+    return value
+
+
+def capture_record(project_slug: str, path: str, request, body: bytes) -> dict:
+    """
+    One captured request. The file holds one JSON object per line:
+    {"ts", "slug", "method", "path", "query", "headers", "body" | "body_b64"}.
+    Credential headers are redacted (see SENSITIVE_HEADERS).
+    """
+    record = {
+        "ts": time.time(),
+        "slug": project_slug,
+        "method": request.method,
+        "path": path,
+        "query": request.url.query,
+        "headers": {k: captured_header(k, v) for k, v in request.headers.items() if k not in SKIPPED_HEADERS},
+    }
+    if body:
+        try:
+            record["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            record["body_b64"] = base64.b64encode(body).decode("ascii")
+    return record
+
+
+def record_body(record: dict) -> bytes | None:
+    if "body" in record:
+        return record["body"].encode("utf-8")
+    if "body_b64" in record:
+        return base64.b64decode(record["body_b64"])
+    return None
+
+
+class TrafficCapture:
+    """
+    Appends captured requests to CAPTURE_PATH as newline-delimited JSON.
+    Like the log pipeline, requests only enqueue; a background task writes
+    batches from a worker thread, and records are dropped (and counted)
+    if the disk can't keep up.
+    """
+
+    def __init__(self, path: str = CAPTURE_PATH, max_bytes: int = CAPTURE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = bool(path)
+        self._queue = asyncio.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+        self._file = None
+        # A write cancelled on shutdown finishes in its thread while stop() writes the rest
+        self._lock = threading.Lock()
+        self._task = None
+        self.written = 0
+        self.dropped = 0
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written_total": self.written,
+            "dropped_total": self.dropped,
+        }
+
+    def submit(self, record: dict):
+        """Queues one record. Never blocks."""
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._file = open(self.path, "ab")
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._file is not None:
+            batch = self._drain([])
+            while batch:
+                await asyncio.to_thread(self._write, batch)
+                batch = self._drain([])
+            self._file.close()
+            self._file = None
+
+    async def run(self):
+        """Long-running writer loop; start it once per process."""
+        while True:
+            batch = self._drain([await self._queue.get()])
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except OSError as e:
+                self.dropped += len(batch)
+                print(f"Dropped {len(batch)} captured requests: {e}")
+
+    def _drain(self, batch: list) -> list:
+        while len(batch) < CAPTURE_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        with self._lock:
+            self._write_locked(batch)
+
+    def _write_locked(self, batch: list):
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            if self.enabled:
+                print(f"Capture file {self.path} reached its size limit; capturing stopped.")
+                self.enabled = False
+            self.dropped += len(batch)
+            return
+        self._file.write(b"".join(orjson.dumps(record) + b"\n" for record in batch))
+        self._file.flush()
+        self.written += len(batch)
+
+
+traffic_capture = TrafficCapture()
@@ -1,57 +1,507 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from . import models
 from .database import redis_client  # NEW: Import redis_client
 import json
+import os
 
+# Engine-wide state limits for projects that don't set their own; 0 = no limit.
+# Items per collection: the oldest are dropped as new ones arrive.
+STATE_MAX_ITEMS = int(os.getenv("STATE_MAX_ITEMS", "10000"))
+# Total stored JSON bytes per project: writes past it are refused.
+STATE_MAX_BYTES = int(os.getenv("STATE_MAX_BYTES", str(64 * 1024 * 1024)))
+# A collection expires after this long without a write.
+STATE_TTL_S = int(os.getenv("STATE_TTL_S", str(7 * 24 * 3600)))
 
-# --- Project & Endpoint Functions (existing) ---
 
-def get_project_by_slug(db: Session, slug: str):
-    """Finds a project by its unique URL slug."""
-    return db.query(models.Project).filter(models.Project.url_slug == slug).first()
+# --- Endpoint Functions ---
+# Projects are looked up by slug through route_cache.
 
+def find_matching_endpoint(project, path: str, method: str):
+    """
+    Finds the endpoint whose path template matches, e.g. "/users/{id}".
+    Matching runs against the project's cached route tries, not the DB.
+    Returns (endpoint, path_params).
+    """
+    return project.find_endpoint(path=path, method=method)
+
+
+# --- NEW: Redis State Functions ---
+# Each stateful collection (e.g. "/users") is three keys:
+#   {ns}{path}:items  hash    item id -> item JSON
+#   {ns}{path}:order  zset    item id scored by insertion seq
+#   {ns}{path}:seq    counter used for ids and ordering
+# so single-item reads and writes are O(1) and pages are ranged by rank.
+# {ns}usage is a hash of path -> stored bytes, plus "#total", kept in step
+# by the write scripts below.
+#
+# {ns} is the project's current generation: "state:{project_id}:g{gen}:",
+# or "state:{project_id}:" for generation 0. state:{project_id}:gen points
+# at it, so a reset is one SET no matter how much state there is. Every
+# script looks the generation up itself, so a write can't straddle a reset.
+# Retired generations are queued in STATE_GC_KEY for the sweeper.
+#
+# Because the scripts build key names from the generation they read (and
+# reconcile walks the usage hash), they touch keys not listed in KEYS:
+# state needs a single Redis instance, not Redis Cluster.
+
+STATE_GC_KEY = "state:gc"
+TOTAL_FIELD = "#total"
+# Fixture items per HSET/ZADD when loading a snapshot
+SNAPSHOT_CHUNK = 1000
+
+
+class StateBudgetExceeded(Exception):
+    """A write would take the project's state past its byte budget."""
+
+
+class StateLimits:
+    """A project's state limits. None means the engine default; 0 means no limit."""
+    __slots__ = ("max_items", "max_bytes", "ttl_ms")
+
+    def __init__(self, max_items: int | None = None, max_bytes: int | None = None, ttl_s: int | None = None):
+        self.max_items = STATE_MAX_ITEMS if max_items is None else max_items
+        self.max_bytes = STATE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl_ms = (STATE_TTL_S if ttl_s is None else ttl_s) * 1000
+
+
+DEFAULT_STATE_LIMITS = StateLimits()
+
+
+def get_state_base(project_id: int) -> str:
+    return f"state:{project_id}:"
+
+
+def get_generation_key(project_id: int) -> str:
+    """Holds the project's current generation."""
+    return f"state:{project_id}:gen"
+
+
+def state_namespace(project_id: int, generation: int) -> str:
+    """Key prefix of one generation of a project's state, e.g. "state:1:g3:"."""
+    base = get_state_base(project_id)
+    return f"{base}g{generation}:" if generation else base
+
+
+def split_item_path(path: str):
+    """'/users/42' -> ('/users', '42'). Returns None for the root path."""
+    parent, _, item_id = path.rpartition("/")
+    if not item_id:
+        return None
+    return parent or "/", item_id
+
+
+# Shared by the state scripts. KEYS[1] is always the generation key and
+# ARGV[1] the project's "state:{project_id}:" base. Usage is counted as
+# the bytes of stored item JSON.
+STATE_LUA = """
+local TOTAL = '#total'
+
+local function namespace()
+    local gen = redis.call('GET', KEYS[1])
+    if gen and gen ~= '0' then
+        return ARGV[1] .. 'g' .. gen .. ':'
+    end
+    return ARGV[1]
+end
+
+local function account(usage, path, delta)
+    if delta == 0 then
+        return
+    end
+    if redis.call('HINCRBY', usage, path, delta) <= 0 then
+        redis.call('HDEL', usage, path)
+    end
+    redis.call('HINCRBY', usage, TOTAL, delta)
+end
+
+-- Forgets collections that have expired since they were counted
+local function reconcile(usage, ns)
+    local entries = redis.call('HGETALL', usage)
+    local total = 0
+    for i = 1, #entries, 2 do
+        local path = entries[i]
+        if path ~= TOTAL then
+            if redis.call('EXISTS', ns .. path .. ':items') == 1 then
+                total = total + tonumber(entries[i + 1])
+            else
+                redis.call('HDEL', usage, path)
+            end
+        end
+    end
+    redis.call('HSET', usage, TOTAL, total)
+    return total
+end
+
+local function within_budget(usage, ns, delta, max_bytes)
+    if max_bytes <= 0 or delta <= 0 then
+        return true
+    end
+    local total = tonumber(redis.call('HGET', usage, TOTAL) or '0')
+    if total + delta <= max_bytes then
+        return true
+    end
+    return reconcile(usage, ns) + delta <= max_bytes
+end
+
+-- Idle expiry: every write pushes the collection's keys' TTL back out
+local function touch(ttl_ms, keys)
+    for _, key in ipairs(keys) do
+        if ttl_ms > 0 then
+            redis.call('PEXPIRE', key, ttl_ms)
+        else
+            redis.call('PERSIST', key)
+        end
+    end
+end
+
+local function remove_ids(items, order, ids)
+    for i = 1, #ids, 1000 do
+        local chunk = {unpack(ids, i, math.min(i + 999, #ids))}
+        redis.call('ZREM', order, unpack(chunk))
+        redis.call('HDEL', items, unpack(chunk))
+    end
+end
+"""
+
+# One round trip for a stateful GET: a page of the collection at the path,
+# plus the single item the path would name inside its parent collection.
+# ARGV: base, path, start, stop, parent path, item id ('' for none)
+# Returns {total, item_or_false, page_item, ...}.
+READ_SCRIPT = redis_client.register_script(STATE_LUA + """
+local ns = namespace()
+local order, items = ns .. ARGV[2] .. ':order', ns .. ARGV[2] .. ':items'
+local total = redis.call('ZCARD', order)
+local item = false
+if ARGV[6] ~= '' then
+    item = redis.call('HGET', ns .. ARGV[5] .. ':items', ARGV[6])
+end
+local result = {total, item}
+if total > 0 and tonumber(ARGV[4]) >= tonumber(ARGV[3]) then
+    local ids = redis.call('ZRANGE', order, ARGV[3], ARGV[4])
+    if #ids > 0 then
+        local found = redis.call('HMGET', items, unpack(ids))
+        for i = 1, #found do
+            result[#result + 1] = found[i]
+        end
+    end
+end
+return result
+""")
+
+# ARGV: base, path, item id
+ITEM_SCRIPT = redis_client.register_script(STATE_LUA + """
+return redis.call('HGET', namespace() .. ARGV[2] .. ':items', ARGV[3])
+""")
+
+# ARGV: base, path, item JSON, item id ('' = use the next seq), whether the
+# JSON is an object that needs that id added ('1'/'0'), max items,
+# max bytes, ttl ms.
+# Trims the oldest items past the cap in the same step (trim-on-push).
+# Returns {1, seq}, or {0, seq} if the write would exceed the byte budget.
+ADD_SCRIPT = redis_client.register_script(STATE_LUA + """
+local ns, path = namespace(), ARGV[2]
+local items_key, order_key, seq_key, usage = ns .. path .. ':items', ns .. path .. ':order', ns .. path .. ':seq', ns .. 'usage'
+local max_items, max_bytes, ttl_ms = tonumber(ARGV[6]), tonumber(ARGV[7]), tonumber(ARGV[8])
 
-def find_matching_endpoint(db: Session, project_id: int, path: str, method: str):
+local seq = redis.call('INCR', seq_key)
+local item, id = ARGV[3], ARGV[4]
+if id == '' then
+    -- Skip numbers a client already used as explicit ids
+    while redis.call('ZSCORE', order_key, tostring(seq)) do
+        seq = redis.call('INCR', seq_key)
+    end
+    id = tostring(seq)
+    if ARGV[5] == '1' then
+        -- Same text json.dumps would give for the object with "id" added last
+        if item == '{}' then
+            item = '{"id": ' .. seq .. '}'
+        else
+            item = string.sub(item, 1, -2) .. ', "id": ' .. seq .. '}'
+        end
+    end
+elseif string.len(id) <= 15 and string.match(id, '^%d+$') and tonumber(id) > seq then
+    -- Keep seq at or above the highest numeric id, as snapshots do
+    redis.call('SET', seq_key, id)
+end
+
+local is_new = redis.call('ZSCORE', order_key, id) == false
+local delta = string.len(item) - redis.call('HSTRLEN', items_key, id)
+local evict = {}
+if max_items > 0 and is_new then
+    local excess = redis.call('ZCARD', order_key) + 1 - max_items
+    if excess > 0 then
+        evict = redis.call('ZRANGE', order_key, 0, excess - 1)
+        for _, old in ipairs(evict) do
+            delta = delta - redis.call('HSTRLEN', items_key, old)
+        end
+    end
+end
+if not within_budget(usage, ns, delta, max_bytes) then
+    return {0, seq}
+end
+
+remove_ids(items_key, order_key, evict)
+redis.call('HSET', items_key, id, item)
+-- NX: re-posting an existing id replaces it but keeps its position
+redis.call('ZADD', order_key, 'NX', seq, id)
+account(usage, path, delta)
+touch(ttl_ms, {items_key, order_key, seq_key, usage})
+return {1, seq}
+""")
+
+# HSET only if the item is already in the collection.
+# ARGV: base, path, item id, item JSON, max bytes, ttl ms
+# Returns 1, 0 if there's no such item, or -1 if over the byte budget.
+REPLACE_SCRIPT = redis_client.register_script(STATE_LUA + """
+local ns, path, id, item = namespace(), ARGV[2], ARGV[3], ARGV[4]
+local items_key, order_key, usage = ns .. path .. ':items', ns .. path .. ':order', ns .. 'usage'
+if not redis.call('ZSCORE', order_key, id) then
+    return 0
+end
+local delta = string.len(item) - redis.call('HSTRLEN', items_key, id)
+if not within_budget(usage, ns, delta, tonumber(ARGV[5])) then
+    return -1
+end
+redis.call('HSET', items_key, id, item)
+account(usage, path, delta)
+touch(tonumber(ARGV[6]), {items_key, order_key, ns .. path .. ':seq', usage})
+return 1
+""")
+
+# ARGV: base, path, item id
+DELETE_SCRIPT = redis_client.register_script(STATE_LUA + """
+local ns, path, id = namespace(), ARGV[2], ARGV[3]
+local items_key = ns .. path .. ':items'
+local size = redis.call('HSTRLEN', items_key, id)
+local deleted = redis.call('HDEL', items_key, id)
+redis.call('ZREM', ns .. path .. ':order', id)
+account(ns .. 'usage', path, -size)
+return deleted
+""")
+
+# Points the project at a new generation and queues the old one for the
+# sweeper. KEYS: generation key, STATE_GC_KEY   ARGV: project id, new generation
+SWITCH_SCRIPT = redis_client.register_script("""
+local old = redis.call('GET', KEYS[1]) or '0'
+redis.call('SET', KEYS[1], ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[1] .. ':' .. old)
+return old
+""")
+
+
+async def add_item_to_state(project_id: int, path: str, item: dict, params: dict | None = None,
+                            limits: StateLimits = DEFAULT_STATE_LIMITS):
     """
-    Finds the first matching endpoint for a project.
-    We'll implement basic string matching for now.
+    Adds a new item (as JSON) to a collection in Redis.
+    Items without an "id" get the next number in the collection's sequence.
+    Captured path parameters fill in any fields the body didn't set, so
+    POST /users/7/posts stores the post with "user_id": "7".
+    Raises StateBudgetExceeded if the project's state is full.
     """
-    # This is a simple version. It only finds exact matches.
-    endpoint = db.query(models.Endpoint) \
-        .filter_by(project_id=project_id, method=method, path=path) \
-        .first()
+    needs_id = False
+    item_id = ""
+    if isinstance(item, dict):
+        if params:
+            for name, value in params.items():
+                item.setdefault(name, value)
+        if "id" in item:
+            item_id = str(item["id"])
+        else:
+            needs_id = True
 
-    return endpoint
+    added, seq = await ADD_SCRIPT(
+        keys=[get_generation_key(project_id)],
+        args=[get_state_base(project_id), path, json.dumps(item), item_id, int(needs_id),
+              limits.max_items, limits.max_bytes, limits.ttl_ms],
+        client=redis_client
+    )
+    if not added:
+        raise StateBudgetExceeded()
+    if needs_id:
+        item["id"] = int(seq)
+    return item
 
 
-# --- NEW: Redis State Functions ---
+async def read_state(project_id: int, path: str, offset: int, limit: int):
+    """
+    Returns (items_json, total, item_json) in one round trip:
+    items_json/total describe a page of the collection at `path`, and
+    item_json is the single item `path` names in its parent (or None).
+    Items stay as their stored JSON strings so the caller can splice them
+    into the response without decoding each one.
+    """
+    item_path = split_item_path(path)
+    result = await READ_SCRIPT(
+        keys=[get_generation_key(project_id)],
+        args=[get_state_base(project_id), path, offset, offset + limit - 1,
+              item_path[0] if item_path else "", item_path[1] if item_path else ""],
+        client=redis_client
+    )
+    total, item_json, items_json = result[0], result[1], result[2:]
+    # A page can race with a delete between ZRANGE and HMGET; skip the holes.
+    return [item for item in items_json if item], total, item_json or None
+
+
+async def get_state_item(project_id: int, path: str, item_id: str):
+    item_json = await ITEM_SCRIPT(
+        keys=[get_generation_key(project_id)],
+        args=[get_state_base(project_id), path, item_id],
+        client=redis_client
+    )
+    return json.loads(item_json) if item_json is not None else None
+
+
+async def replace_state_item(project_id: int, path: str, item_id: str, item,
+                             limits: StateLimits = DEFAULT_STATE_LIMITS) -> bool:
+    """
+    Overwrites an existing item. Returns False if it doesn't exist;
+    raises StateBudgetExceeded if the new version doesn't fit.
+    """
+    replaced = await REPLACE_SCRIPT(
+        keys=[get_generation_key(project_id)],
+        args=[get_state_base(project_id), path, item_id, json.dumps(item), limits.max_bytes, limits.ttl_ms],
+        client=redis_client
+    )
+    if replaced == -1:
+        raise StateBudgetExceeded()
+    return bool(replaced)
 
-def get_state_key(project_id: int, path: str) -> str:
-    """Generates a consistent Redis key for a given resource path."""
-    # e.g., "state:1:/users"
-    return f"state:{project_id}:{path}"
+
+async def delete_state_item(project_id: int, path: str, item_id: str) -> bool:
+    deleted = await DELETE_SCRIPT(
+        keys=[get_generation_key(project_id)],
+        args=[get_state_base(project_id), path, item_id],
+        client=redis_client
+    )
+    return bool(deleted)
+
+
+# --- Snapshots & Reset ---
+# A snapshot is {"collections": {"/users": [item, ...], ...}}, the same
+# shape export_state returns.
+
+def parse_snapshot(snapshot) -> dict:
+    """
+    Validates a snapshot; returns {path: [items]}. Raises ValueError,
+    including for two items with the same "id" in one collection.
+    """
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get("collections", {}), dict):
+        raise ValueError('Expected {"collections": {"/path": [items]}}')
+    collections = {}
+    for path, items in snapshot.get("collections", {}).items():
+        if not isinstance(path, str) or not path.startswith("/"):
+            raise ValueError(f"Collection paths must start with '/': {path!r}")
+        if not isinstance(items, list):
+            raise ValueError(f"Collection {path} must be a list of items")
+        seen = set()
+        for item in items:
+            if isinstance(item, dict) and "id" in item:
+                item_id = str(item["id"])
+                if item_id in seen:
+                    raise ValueError(f"Duplicate id {item_id!r} in collection {path}")
+                seen.add(item_id)
+        if len(path) > 1 and path.endswith("/"):
+            path = path[:-1]
+        collections[path] = items
+    return collections
+
+
+async def reset_state(project_id: int, collections: dict | None = None,
+                      limits: StateLimits = DEFAULT_STATE_LIMITS) -> int:
+    """
+    Switches the project to a new generation of state, empty or filled
+    from `collections` ({path: [items]}), and returns it. The fixtures are
+    written to the new generation with one pipeline before it goes live,
+    so requests see either the old state or the complete new one. The
+    old generation is left to the sweeper.
+    """
+    generation = await redis_client.incr(f"{get_state_base(project_id)}gens")
+    if collections:
+        await _write_snapshot(state_namespace(project_id, generation), collections, limits)
+    await SWITCH_SCRIPT(
+        keys=[get_generation_key(project_id), STATE_GC_KEY],
+        args=[project_id, generation],
+        client=redis_client
+    )
+    return generation
+
+
+def numeric_id(item_id: str) -> int:
+    return int(item_id) if item_id.isdigit() else 0
+
+
+def snapshot_entries(items: list) -> dict:
+    """
+    {item id: item JSON} in collection order. Items without an "id" are
+    numbered after the highest numeric id given, so they can't collide.
+    """
+    explicit = [str(item["id"]) for item in items if isinstance(item, dict) and "id" in item]
+    seq = max(map(numeric_id, explicit), default=0)
+    entries = {}
+    for item in items:
+        if isinstance(item, dict) and "id" in item:
+            item_id = str(item["id"])
+        else:
+            seq += 1
+            item_id = str(seq)
+            if isinstance(item, dict):
+                item = {**item, "id": seq}
+        entries[item_id] = json.dumps(item)
+    return entries
 
 
-def add_item_to_state(project_id: int, path: str, item: dict):
-    """Adds a new item (as JSON) to a list in Redis."""
-    key = get_state_key(project_id, path)
-    item_json = json.dumps(item)
-    redis_client.rpush(key, item_json)  # rpush = append to list
+async def _write_snapshot(ns: str, collections: dict, limits: StateLimits):
+    encoded = {}
+    total = 0
+    for path, items in collections.items():
+        if limits.max_items:
+            items = items[-limits.max_items:]  # as if pushed one by one
+        entries = snapshot_entries(items)
+        size = sum(len(item_json) for item_json in entries.values())
+        # The next POST must get an id (and order score) past every stored one
+        seq = max(len(entries), max(map(numeric_id, entries), default=0))
+        encoded[path] = (entries, size, seq)
+        total += size
+    if limits.max_bytes and total > limits.max_bytes:
+        raise StateBudgetExceeded()
 
+    pipe = redis_client.pipeline(transaction=False)
+    usage = {TOTAL_FIELD: total}
+    for path, (entries, size, seq) in encoded.items():
+        key = f"{ns}{path}"
+        ids = list(entries)
+        for start in range(0, len(ids), SNAPSHOT_CHUNK):
+            chunk = ids[start:start + SNAPSHOT_CHUNK]
+            pipe.hset(f"{key}:items", mapping={item_id: entries[item_id] for item_id in chunk})
+            pipe.zadd(f"{key}:order", {item_id: start + offset + 1 for offset, item_id in enumerate(chunk)})
+        pipe.set(f"{key}:seq", seq)
+        if size:
+            usage[path] = size
+        if limits.ttl_ms:
+            for suffix in (":items", ":order", ":seq"):
+                pipe.pexpire(f"{key}{suffix}", limits.ttl_ms)
+    pipe.hset(f"{ns}usage", mapping=usage)
+    if limits.ttl_ms:
+        pipe.pexpire(f"{ns}usage", limits.ttl_ms)
+    await pipe.execute()
 
-def get_state_as_list(project_id: int, path: str) -> list:
-    """Retrieves all items for a given state key as a list of dicts."""
-    key = get_state_key(project_id, path)
-    # lrange(key, 0, -1) means "get all items from the list"
-    items_json = redis_client.lrange(key, 0, -1)
 
-    # Convert each JSON string back into a Python dict
-    items = [json.loads(item) for item in items_json]
-    return items
+async def export_state(project_id: int) -> bytes:
+    """The project's current state as a snapshot, already encoded as JSON."""
+    generation = int(await redis_client.get(get_generation_key(project_id)) or 0)
+    ns = state_namespace(project_id, generation)
+    paths = sorted(path for path in await redis_client.hkeys(f"{ns}usage") if path.startswith("/"))
 
+    pipe = redis_client.pipeline(transaction=False)
+    for path in paths:
+        pipe.zrange(f"{ns}{path}:order", 0, -1)
+    orders = await pipe.execute() if paths else []
+    pipe = redis_client.pipeline(transaction=False)
+    for path, ids in zip(paths, orders):
+        if ids:
+            pipe.hmget(f"{ns}{path}:items", ids)
+    found = iter(await pipe.execute() if any(orders) else [])
 
-def clear_state(project_id: int, path: str):
-    """Deletes a state key, clearing its list."""
-    key = get_state_key(project_id, path)
-    redis_client.delete(key)
\ No newline at end of file
+    parts = []
+    for path, ids in zip(paths, orders):
+        items = next(found) if ids else []
+        parts.append(json.dumps(path) + ": [" + ", ".join(item for item in items if item) + "]")
+    return ('{"generation": %d, "collections": {%s}}' % (generation, ", ".join(parts))).encode("utf-8")
@@ -1,46 +1,470 @@
+import json
+import os
 import re
+from collections import OrderedDict
+import orjson
 from faker import Faker
 
 # This regex finds everything inside {{...}}
-REGEX_PATTERN = r"\{\{([^}]+)\}\}"
+REGEX_PATTERN = re.compile(r"\{\{([^}]+)\}\}")
 
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "4096"))
+# Upper bound on the items a body's {"$repeat": ...} nodes generate per
+# render, counting nested repeats multiplied out; larger bodies are rejected.
+REPEAT_MAX_ITEMS = int(os.getenv("REPEAT_MAX_ITEMS", "100000"))
+# Opt-in speed-up: most providers cost tens of microseconds per value, so
+# with this set a long list only gets this many distinct values per field
+# and the rest are drawn from them. 0 (the default) keeps every value unique.
+REPEAT_DISTINCT_VALUES = int(os.getenv("REPEAT_DISTINCT_VALUES", "0"))
+# Providers that fill id-like fields, which clients expect to be unique, are never reused
+DISTINCT_PROVIDERS = {
+    "uuid4", "md5", "sha1", "sha256", "pystr", "pyint", "random_int", "random_number",
+    "email", "safe_email", "free_email", "company_email", "ascii_email", "ascii_safe_email",
+    "ascii_free_email", "ascii_company_email", "user_name", "ssn", "iban", "isbn10", "isbn13",
+}
+
+# Slot kinds
+FAKER_SLOT = "faker"
+PARAM_SLOT = "param"
 
-def parse_faker_string(body_string: str, fake: Faker) -> str:
-    """
-    Finds all {{Faker.provider()}} tags and replaces them with fake data.
 
-    Example:
-    Input: "{\"name\": \"{{Faker.name()}}\"}"
-    Output: "{\"name\": \"John Doe\"}"
+class ProviderTable:
+    """
+    Resolves "name" -> bound Faker provider once per name, so rendering is a
+    dict lookup per slot instead of a getattr on Faker's proxy.
     """
 
-    # We use a function as the second argument to re.sub
-    # This function will be called for every match
-    def replacer(match):
-        # Get the inner part, e.g., "Faker.name()"
-        faker_call = match.group(1).strip()
+    def __init__(self, fake: Faker):
+        self.fake = fake
+        self._funcs = {}
 
-        # We only support simple providers for now, e.g., "Faker.name()"
-        # We'll extract "name"
-        if not faker_call.startswith("Faker.") or not faker_call.endswith("()"):
-            # Not a valid call, return the original tag
-            return match.group(0)
+    @property
+    def random(self):
+        # Looked up each time: seed_instance() swaps in a new Random
+        return self.fake.random
 
-        # Extract the provider name, e.g., "name" from "Faker.name()"
-        provider_name = faker_call[len("Faker."):-len("()")]
+    def get(self, provider_name: str):
+        try:
+            return self._funcs[provider_name]
+        except KeyError:
+            func = getattr(self.fake, provider_name, None)
+            func = func if callable(func) else None
+            self._funcs[provider_name] = func
+            return func
 
+    def batch(self, provider_name: str, count: int) -> list:
+        """count values from one provider, in a single tight loop."""
+        func = self.get(provider_name)
+        if func is None:
+            return [f"[Invalid Faker provider: {provider_name}]"] * count
         try:
-            # Get the actual function from the 'fake' object
-            func = getattr(fake, provider_name, None)
+            return [func() for _ in range(count)]
+        except Exception as e:
+            return [f"[Error: {e}]"] * count
+
+
+class Template:
+    """
+    A Response.body split once into static text and tag slots.
+
+    fragments always has one more entry than slots: rendering is
+    fragments[0] + value(slots[0]) + fragments[1] + ... + fragments[-1].
+    """
+    __slots__ = ("fragments", "slots")
+
+    def __init__(self, fragments: list, slots: list):
+        self.fragments = fragments
+        self.slots = slots
+
+    @property
+    def is_static(self) -> bool:
+        return not self.slots
 
-            if callable(func):
-                # Call the function (e.g., fake.name()) and return its value
-                return str(func())
+    def render(self, providers: ProviderTable, params: dict | None = None) -> str:
+        fragments = self.fragments
+        if not self.slots:
+            return fragments[0]
+
+        parts = [fragments[0]]
+        for index, (kind, name, tag) in enumerate(self.slots):
+            if kind == FAKER_SLOT:
+                parts.append(render_provider(providers, name))
+            elif params and name in params:
+                parts.append(params[name])
             else:
-                # 'Faker.invalid_name()' was used
-                return f"[Invalid Faker provider: {provider_name}]"
-        except Exception as e:
-            return f"[Error: {e}]"
+                parts.append(tag)
+            parts.append(fragments[index + 1])
+        return "".join(parts)
+
+    def render_many(self, providers: ProviderTable, params: dict | None, count: int) -> list:
+        """count renders at once; each faker slot is filled by one batch call."""
+        fragments = self.fragments
+        if not self.slots:
+            return [fragments[0]] * count
+
+        columns = []
+        for kind, name, tag in self.slots:
+            if kind == FAKER_SLOT:
+                columns.append([str(value) for value in batch_provider(providers, name, count)])
+            elif params and name in params:
+                columns.append([params[name]] * count)
+            else:
+                columns.append([tag] * count)
+        rendered = []
+        for row in zip(*columns):
+            parts = [fragments[0]]
+            for index, value in enumerate(row):
+                parts.append(value)
+                parts.append(fragments[index + 1])
+            rendered.append("".join(parts))
+        return rendered
+
+    def iter_items(self, providers: ProviderTable, params: dict | None, chunk_size: int):
+        """Text bodies stream as a single item (see JsonTemplate.iter_items)."""
+        yield [orjson.loads(self.render_bytes(providers, params))]
+
+    def render_bytes(self, providers: ProviderTable, params: dict | None = None) -> bytes:
+        """
+        Fallback for bodies that aren't JSON until rendered (e.g. a bare
+        {{Faker.random_int()}} as a value). Valid JSON goes out as-is,
+        anything else is sent as a JSON string.
+        """
+        text = self.render(providers, params)
+        try:
+            orjson.loads(text)
+        except orjson.JSONDecodeError:
+            return dump_json(text)
+        return text.encode("utf-8")
+
+
+def call_provider(providers: ProviderTable, provider_name: str):
+    """Returns the provider's value with its own type (int, date, list...)."""
+    func = providers.get(provider_name)
+    if func is None:
+        # 'Faker.invalid_name()' was used
+        return f"[Invalid Faker provider: {provider_name}]"
+    try:
+        # Call the function (e.g., fake.name()) and return its value
+        return func()
+    except Exception as e:
+        return f"[Error: {e}]"
+
+
+def batch_provider(providers: ProviderTable, provider_name: str, count: int) -> list:
+    """count values for one field of a $repeat list (see REPEAT_DISTINCT_VALUES)."""
+    if not REPEAT_DISTINCT_VALUES or count <= REPEAT_DISTINCT_VALUES or provider_name in DISTINCT_PROVIDERS:
+        return providers.batch(provider_name, count)
+    values = providers.batch(provider_name, REPEAT_DISTINCT_VALUES)
+    return values + providers.random.choices(values, k=count - len(values))
+
+
+def render_provider(providers: ProviderTable, provider_name: str) -> str:
+    return str(call_provider(providers, provider_name))
+
+
+def dump_json(value) -> bytes:
+    # default=str covers the Faker types orjson doesn't know, e.g. Decimal
+    try:
+        return orjson.dumps(value, default=str)
+    except TypeError:
+        # orjson refuses ints past 64 bits; the stdlib encodes any value
+        return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def parse_tag(tag_body: str):
+    """
+    Classifies the inside of a {{...}} tag.
+    Returns (kind, name) or None if the tag isn't one we understand.
+    """
+    call = tag_body.strip()
+
+    # Path parameters, e.g., "Params.id" for an endpoint "/users/{id}"
+    if call.startswith("Params."):
+        return PARAM_SLOT, call[len("Params."):]
+
+    # We only support simple providers for now, e.g., "Faker.name()"
+    if call.startswith("Faker.") and call.endswith("()"):
+        provider_name = call[len("Faker."):-len("()")]
+        if provider_name.isidentifier() and not provider_name.startswith("_"):
+            return FAKER_SLOT, provider_name
+    return None
+
+
+def compile_template(body_string: str) -> Template:
+    """Scans the body once and returns its Template."""
+    fragments = []
+    slots = []
+    text = []
+    position = 0
+    for match in REGEX_PATTERN.finditer(body_string):
+        text.append(body_string[position:match.start()])
+        position = match.end()
+        parsed = parse_tag(match.group(1))
+        if parsed is None:
+            # Not a valid call, keep the original tag as text
+            text.append(match.group(0))
+            continue
+        fragments.append("".join(text))
+        text = []
+        slots.append((parsed[0], parsed[1], match.group(0)))
+    text.append(body_string[position:])
+    fragments.append("".join(text))
+    return Template(fragments, slots)
+
+
+# --- Structure-aware JSON templates ---
+# When the body is itself valid JSON (tags sitting inside string values),
+# we compile the parsed tree instead of the text. Rendering fills values
+# into the tree and serializes once, so there is no json.loads on the hot
+# path and Faker output can never break the quoting.
+
+class ConstNode:
+    """A subtree without any tags, built once and reused as-is."""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def render(self, providers, params):
+        return self.value
+
+    def render_many(self, providers, params, count):
+        return [self.value] * count
+
+
+class SlotNode:
+    """A string that is exactly one tag; renders to the provider's typed value."""
+    __slots__ = ("kind", "name", "tag")
+
+    def __init__(self, kind, name, tag):
+        self.kind = kind
+        self.name = name
+        self.tag = tag
+
+    def render(self, providers, params):
+        if self.kind == FAKER_SLOT:
+            return call_provider(providers, self.name)
+        if params and self.name in params:
+            return params[self.name]
+        return self.tag
+
+    def render_many(self, providers, params, count):
+        if self.kind == FAKER_SLOT:
+            return batch_provider(providers, self.name, count)
+        return [self.render(providers, params)] * count
+
+
+class TextNode:
+    """A string mixing text and tags, e.g. "Hello {{Faker.name()}}"."""
+    __slots__ = ("template",)
+
+    def __init__(self, template):
+        self.template = template
+
+    def render(self, providers, params):
+        return self.template.render(providers, params)
+
+    def render_many(self, providers, params, count):
+        return self.template.render_many(providers, params, count)
+
+
+class ListNode:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+    def render(self, providers, params):
+        return [item.render(providers, params) for item in self.items]
+
+    def render_many(self, providers, params, count):
+        columns = [item.render_many(providers, params, count) for item in self.items]
+        return [list(row) for row in zip(*columns)]
+
+
+class DictNode:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items  # [(key_node, value_node)]
+
+    def render(self, providers, params):
+        return {str(key.render(providers, params)): value.render(providers, params)
+                for key, value in self.items}
+
+    def render_many(self, providers, params, count):
+        # One batch per field, then the items are zipped together
+        keys = [key.render_many(providers, params, count) for key, _ in self.items]
+        values = [value.render_many(providers, params, count) for _, value in self.items]
+        return [
+            {str(key[index]): value[index] for key, value in zip(keys, values)}
+            for index in range(count)
+        ]
+
+
+class RepeatNode:
+    """
+    {"$repeat": 100, "$item": {...}} renders to a list of 100 items, or a
+    random length for {"$repeat": [10, 20], ...}. The item template is
+    rendered for all items at once, field by field.
+    """
+    __slots__ = ("low", "high", "item")
+
+    def __init__(self, low, high, item):
+        self.low = low
+        self.high = high
+        self.item = item
+
+    def count(self, providers):
+        if self.low == self.high:
+            return self.low
+        return providers.random.randint(self.low, self.high)
+
+    def render(self, providers, params):
+        return self.item.render_many(providers, params, self.count(providers))
+
+    def render_many(self, providers, params, count):
+        # Nested repeats: generate every inner item in one go, then split
+        sizes = [self.count(providers) for _ in range(count)]
+        items = self.item.render_many(providers, params, sum(sizes))
+        lists = []
+        start = 0
+        for size in sizes:
+            lists.append(items[start:start + size])
+            start += size
+        return lists
+
+
+def parse_repeat(spec):
+    """Returns (low, high) for a $repeat count or [min, max], or None if invalid."""
+    if isinstance(spec, bool):
+        return None
+    if isinstance(spec, int):
+        low = high = spec
+    elif (isinstance(spec, list) and len(spec) == 2
+          and all(isinstance(n, int) and not isinstance(n, bool) for n in spec)):
+        low, high = spec
+    else:
+        return None
+    if low < 0 or high < low:
+        return None
+    return min(low, REPEAT_MAX_ITEMS), min(high, REPEAT_MAX_ITEMS)
+
+
+def repeat_items(value) -> int:
+    """Most items the $repeat nodes in a parsed body can generate in one render."""
+    if isinstance(value, list):
+        return sum(repeat_items(item) for item in value)
+    if isinstance(value, dict):
+        if value.keys() == {"$repeat", "$item"}:
+            bounds = parse_repeat(value["$repeat"])
+            if bounds is not None:
+                return bounds[1] * (1 + repeat_items(value["$item"]))
+        return sum(repeat_items(item) for item in value.values())
+    return 0
+
+
+def compile_node(value):
+    if isinstance(value, str):
+        template = compile_template(value)
+        if template.is_static:
+            return ConstNode(value)
+        if len(template.slots) == 1 and template.fragments == ["", ""]:
+            return SlotNode(*template.slots[0])
+        return TextNode(template)
+    if isinstance(value, list):
+        items = [compile_node(item) for item in value]
+        if all(isinstance(item, ConstNode) for item in items):
+            return ConstNode(value)
+        return ListNode(items)
+    if isinstance(value, dict):
+        if value.keys() == {"$repeat", "$item"}:
+            bounds = parse_repeat(value["$repeat"])
+            if bounds is not None:
+                item = compile_node(value["$item"])
+                if isinstance(item, ConstNode) and bounds[0] == bounds[1]:
+                    return ConstNode([item.value] * bounds[0])
+                return RepeatNode(bounds[0], bounds[1], item)
+        items = [(compile_node(key), compile_node(item)) for key, item in value.items()]
+        if all(isinstance(k, ConstNode) and isinstance(v, ConstNode) for k, v in items):
+            return ConstNode(value)
+        return DictNode(items)
+    return ConstNode(value)
+
+
+class JsonTemplate:
+    __slots__ = ("root",)
+
+    def __init__(self, root):
+        self.root = root
+
+    @property
+    def is_static(self) -> bool:
+        return isinstance(self.root, ConstNode)
+
+    def render(self, providers: ProviderTable, params: dict | None = None):
+        return self.root.render(providers, params)
+
+    def render_bytes(self, providers: ProviderTable, params: dict | None = None) -> bytes:
+        return dump_json(self.render(providers, params))
+
+    def iter_items(self, providers: ProviderTable, params: dict | None, chunk_size: int):
+        """
+        Yields the body's top-level items in lists of up to chunk_size, for
+        streamed responses. Only one chunk is ever in memory; a body that
+        isn't a list is a single item.
+        """
+        root = self.root
+        if isinstance(root, RepeatNode):
+            total = root.count(providers)
+            for start in range(0, total, chunk_size):
+                yield root.item.render_many(providers, params, min(chunk_size, total - start))
+        elif isinstance(root, ListNode):
+            items = root.items
+            for start in range(0, len(items), chunk_size):
+                yield [item.render(providers, params) for item in items[start:start + chunk_size]]
+        elif isinstance(root, ConstNode) and isinstance(root.value, list):
+            for start in range(0, len(root.value), chunk_size):
+                yield root.value[start:start + chunk_size]
+        else:
+            yield [self.render(providers, params)]
+
+
+def compile_body(body_string: str):
+    """
+    Compiles a Response.body: a JsonTemplate when the body parses as JSON,
+    otherwise a text Template. Raises ValueError for bodies whose $repeat
+    lists would generate more than REPEAT_MAX_ITEMS items.
+    """
+    try:
+        tree = json.loads(body_string)
+    except (json.JSONDecodeError, TypeError):
+        return compile_template(body_string)
+    items = repeat_items(tree)
+    if items > REPEAT_MAX_ITEMS:
+        raise ValueError(f"$repeat lists can generate up to {items} items; the limit is {REPEAT_MAX_ITEMS}")
+    return JsonTemplate(compile_node(tree))
+
+
+# --- Template Cache ---
+
+_templates = OrderedDict()
+
+
+def get_template(response_id: int, version: int, body_string: str):
+    """
+    Returns the compiled template for a Response row, compiling it only the
+    first time a given (id, version) is seen. version changes whenever the
+    body does, so edited responses never reuse a stale template.
+    """
+    key = (response_id, version)
+    template = _templates.get(key)
+    if template is None:
+        template = compile_body(body_string)
+        _templates[key] = template
+        if len(_templates) > TEMPLATE_CACHE_SIZE:
+            _templates.popitem(last=False)
+    else:
+        _templates.move_to_end(key)
+    return template
 
-    # This finds all matches and replaces them using the 'replacer' function
-    return re.sub(REGEX_PATTERN, replacer, body_string)
\ No newline at end of file
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import time
+from .database import redis_client
+from .metrics import metrics, LOG_FLUSH
+
+# Logs are appended to one capped Redis Stream per project, "logs:{project_id}",
+# which manager-api tails for /ws/logs and reads back for history.
+LOG_STREAM_PREFIX = "logs:"
+# Retention: roughly this many entries per project, none older than the max age
+LOG_STREAM_MAXLEN = int(os.getenv("LOG_STREAM_MAXLEN", "10000"))
+LOG_STREAM_MAX_AGE = int(os.getenv("LOG_STREAM_MAX_AGE_S", "86400"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+# How long the flusher lingers to fill a batch once the first record arrives
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL_MS", "50")) / 1000.0
+LOG_FLUSH_TIMEOUT = float(os.getenv("LOG_FLUSH_TIMEOUT_MS", "1000")) / 1000.0
+
+
+class LogPipeline:
+    """
+    Request logs go into a bounded in-memory queue and a background task
+    appends them to the per-project streams in pipelined batches, so the
+    request path never waits on Redis.
+
+    When the queue is full (Redis slow or down) new records are dropped and
+    counted rather than applying back-pressure to mock traffic.
+    """
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE, batch_size: int = LOG_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self.submitted = 0
+        self.published = 0
+        self.dropped = 0
+        self.batches = 0
+        # Records taken off the queue by a flush that was cancelled mid-way
+        self._in_hand = []
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "submitted_total": self.submitted,
+            "published_total": self.published,
+            "dropped_total": self.dropped,
+            "batches_total": self.batches,
+        }
+
+    def submit(self, record: dict):
+        """Queues one record. Never blocks."""
+        try:
+            self._queue.put_nowait(record)
+            self.submitted += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stops the flush loop, then sends everything still queued."""
+        if self._task is not None:
+            # Before Python 3.12, wait_for can swallow a cancel that lands as
+            # the flush finishes, leaving the loop blocked on an empty queue;
+            # cancel again until it has really stopped.
+            while not self._task.done():
+                self._task.cancel()
+                await asyncio.wait([self._task], timeout=1)
+            self._task = None
+        await self.close()
+
+    async def run(self):
+        """Long-running flush loop; start it once per process."""
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                await asyncio.sleep(LOG_FLUSH_INTERVAL)
+                self._drain_into(batch)
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                # Shutdown: leave the batch for close() to send
+                self._in_hand = batch
+                raise
+
+    async def close(self):
+        """Flushes whatever is still queued; used on shutdown."""
+        batch, self._in_hand = self._in_hand, []
+        self._drain_into(batch)
+        while batch:
+            await self._flush(batch)
+            batch = []
+            self._drain_into(batch)
+
+    def _drain_into(self, batch: list):
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        pipe = redis_client.pipeline(transaction=False)
+        streams = set()
+        for record in batch:
+            project_id = record.get("project_id")
+            if project_id is None:
+                continue  # unknown slug: there is no project stream to show it in
+            key = f"{LOG_STREAM_PREFIX}{project_id}"
+            streams.add(key)
+            pipe.xadd(key, {"data": json.dumps(record)}, maxlen=LOG_STREAM_MAXLEN, approximate=True)
+        if LOG_STREAM_MAX_AGE > 0:
+            # Stream ids start with a ms timestamp, so MINID trims by age
+            min_id = int((time.time() - LOG_STREAM_MAX_AGE) * 1000)
+            for key in streams:
+                pipe.xtrim(key, minid=min_id, approximate=True)
+                # Streams of idle projects disappear entirely
+                pipe.expire(key, LOG_STREAM_MAX_AGE)
+        try:
+            await asyncio.wait_for(pipe.execute(), timeout=LOG_FLUSH_TIMEOUT)
+            self.published += len(batch)
+            self.batches += 1
+            metrics.observe(LOG_FLUSH, started)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.dropped += len(batch)
+            print(f"Dropped {len(batch)} log records: {e}")
+
+
+log_pipeline = LogPipeline()
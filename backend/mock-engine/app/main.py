@@ -1,28 +1,212 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from typing import Annotated
+from fastapi import FastAPI, Request, HTTPException, status
+from fastapi.responses import Response
 import json
-from faker import Faker
 from . import faker_parser
 from . import models, crud
-from .database import engine, get_db, redis_client  # <-- Ensure redis_client is imported
+from .database import engine, redis_client, redis_pool  # <-- Ensure redis_client is imported
+from .route_cache import route_cache, listen_for_changes
+from .log_pipeline import log_pipeline
+from .pagination import page_from_query, default_page
+from .value_pool import value_pool, seeded_providers
+from . import streaming
+from .rate_limit import rate_limiter, retry_after
+from . import metrics as stages
+from .metrics import metrics
+from .capture import traffic_capture, capture_record
+from .state_sweeper import state_sweeper
 import asyncio
+import hmac
+import os
 import random
 import time  # <-- NEW: Import time for timestamp
 
-models.Base.metadata.create_all(bind=engine)
-
 app = FastAPI()
 
-# --- Dependencies ---
-db_dependency = Annotated[Session, Depends(get_db)]
-faker_instance = Faker()
+# Requests carrying this header (or any request to a project with a
+# faker_seed) get reproducible Faker values.
+SEED_HEADER = "x-mock-seed"
+
+# Shared with the manager API, which calls the /internal routes on behalf
+# of project owners and admins. Unset, those routes are turned off.
+INTERNAL_TOKEN = os.getenv("ENGINE_INTERNAL_TOKEN", "")
+INTERNAL_TOKEN_HEADER = "x-internal-token"
+
+
+def json_response(status_code: int, content=None, body: bytes | None = None) -> Response:
+    """Builds a JSON response, serializing once with orjson unless bytes are given."""
+    if body is None:
+        body = faker_parser.dump_json(content)
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so W/"x" matches "x"."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def finish_request(log_payload: dict, method: str, started: float):
+    """Queues the request's log record and counts it, once it has its final status."""
+    submitted = time.perf_counter()
+    log_pipeline.submit(log_payload)
+    metrics.observe(stages.LOG_SUBMIT, submitted)
+    project = log_payload["project_slug"] if "project_id" in log_payload else stages.UNKNOWN_PROJECT
+    metrics.count_request(project, method, log_payload["status"])
+    metrics.observe(stages.TOTAL, started)
+
+
+def register_collectors():
+    """Pool and queue gauges, read when /metrics is scraped."""
+    pool = engine.sync_engine.pool
+    metrics.add_collector("db_pool", lambda: {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    })
+    metrics.add_collector("redis_pool", redis_pool.stats)
+    metrics.add_collector("log_pipeline", log_pipeline.stats)
+    metrics.add_collector("value_pool", value_pool.stats)
+    metrics.add_collector("capture", traffic_capture.stats)
+    metrics.add_collector("state_sweeper", state_sweeper.stats)
+    metrics.add_collector("route_cache", route_cache.stats)
+    metrics.add_collector("rate_limit", rate_limiter.stats)
+
+
+async def read_json_body(request: Request):
+    """The parsed JSON body, or None if it isn't JSON."""
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def state_full(project_slug: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_507_INSUFFICIENT_STORAGE,
+        detail=f"Stateful data for mock project '{project_slug}' is over its size limit"
+    )
+
+
+async def write_state_item(project_id: int, method: str, collection: str, item_id: str, request: Request,
+                           limits: crud.StateLimits = crud.DEFAULT_STATE_LIMITS):
+    """
+    PUT/PATCH/DELETE /{collection}/{id} against the stateful store.
+    Returns None when the item doesn't exist, so the request falls through
+    to the configured mock endpoints.
+    """
+    if method == "DELETE":
+        if await crud.delete_state_item(project_id, collection, item_id):
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+        return None
+
+    current = await crud.get_state_item(project_id, collection, item_id)
+    if current is None:
+        return None
+    try:
+        body_json = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+    if method == "PATCH" and isinstance(current, dict) and isinstance(body_json, dict):
+        item = {**current, **body_json}
+    else:
+        item = body_json
+    if isinstance(item, dict) and isinstance(current, dict) and "id" in current:
+        # The id comes from the URL; the body can't move an item
+        item["id"] = current["id"]
+
+    if not await crud.replace_state_item(project_id, collection, item_id, item, limits):
+        return None  # deleted in the meantime
+    return json_response(status_code=200, content=item)
 
 
 @app.on_event("startup")
 async def startup():
     print("Mock Engine starting up and connecting to DB...")
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    app.state.config_listener = asyncio.create_task(listen_for_changes())
+    log_pipeline.start()
+    value_pool.start()
+    register_collectors()
+    metrics.start()
+    traffic_capture.start()
+    state_sweeper.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.config_listener.cancel()
+    await log_pipeline.stop()
+    await value_pool.stop()
+    await metrics.stop()
+    await traffic_capture.stop()
+    await state_sweeper.stop()
+    await redis_client.aclose()
+    await engine.dispose()
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape target."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# --- State Reset & Snapshots ---
+# For test suites: start each run from a clean slate (or a fixture
+# snapshot) in constant time, and save a project's state as a snapshot.
+# Not public: the manager API checks the caller's role and forwards here.
+
+def require_internal_token(request: Request):
+    token = request.headers.get(INTERNAL_TOKEN_HEADER, "")
+    if not INTERNAL_TOKEN or not hmac.compare_digest(token.encode(), INTERNAL_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+async def get_project_or_404(project_slug: str):
+    project = await route_cache.get(project_slug)
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Mock project with slug '{project_slug}' not found."
+        )
+    return project
+
+
+@app.post("/internal/state/{project_slug}/reset")
+async def reset_state(project_slug: str, request: Request):
+    """
+    Empties the project's stateful data, or replaces it with the snapshot
+    in the body: {"collections": {"/users": [...], ...}}.
+    """
+    require_internal_token(request)
+    project = await get_project_or_404(project_slug)
+    collections = None
+    if await request.body():
+        try:
+            collections = crud.parse_snapshot(await request.json())
+        except (json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid snapshot: {e}")
+    try:
+        generation = await crud.reset_state(project.id, collections, project.state_limits)
+    except crud.StateBudgetExceeded:
+        raise state_full(project_slug)
+    return json_response(status_code=200, content={
+        "project_slug": project_slug,
+        "generation": generation,
+        "collections": len(collections or {}),
+    })
+
+
+@app.get("/internal/state/{project_slug}")
+async def export_state(project_slug: str, request: Request):
+    """The project's stateful data as a snapshot that /reset accepts."""
+    require_internal_token(request)
+    project = await get_project_or_404(project_slug)
+    return json_response(status_code=200, body=await crud.export_state(project.id))
 
 
 @app.api_route("/mock/{project_slug}/{full_path:path}",
@@ -30,9 +214,9 @@ async def startup():
 async def handle_mock_request(
         project_slug: str,
         full_path: str,
-        request: Request,
-        db: db_dependency
+        request: Request
 ):
+    started = time.perf_counter()
     # --- Path Cleaning ---
     path = "/" + full_path
     method = request.method
@@ -41,8 +225,14 @@ async def handle_mock_request(
         path = path[:-1]
     # --- End Path Cleaning ---
 
-    # 1. Find the project first (needed for the log channel)
-    project = crud.get_project_by_slug(db, slug=project_slug)
+    # With CAPTURE_PATH set, every request is recorded as sent, for replay
+    if traffic_capture.enabled:
+        traffic_capture.submit(capture_record(project_slug, path, request, await request.body()))
+
+    # 1. Find the project first (needed for the log channel).
+    # Served from the in-process route cache; only a miss touches the DB.
+    project = await route_cache.get(project_slug)
+    t = metrics.observe(stages.PROJECT_LOOKUP, started)
     if not project:
         # We still log the attempt even if the project is not found
         log_payload = {
@@ -53,13 +243,33 @@ async def handle_mock_request(
             "detail": "Project Not Found",
             "project_slug": project_slug
         }
-        redis_client.publish('mockapi:logs', json.dumps(log_payload))
+        finish_request(log_payload, method, started)
 
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Mock project with slug '{project_slug}' not found."
         )
 
+    # Per-project and per-org token buckets; see rate_limit.RateLimiter
+    if project.rate_limits:
+        wait = await rate_limiter.check(project)
+        t = metrics.observe(stages.RATE_LIMIT, t)
+        if wait is not None:
+            finish_request({
+                "timestamp": time.time(),
+                "method": method,
+                "path": path,
+                "status": 429,
+                "detail": "Rate limit exceeded",
+                "project_id": project.id,
+                "project_slug": project_slug
+            }, method, started)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded for mock project '{project_slug}'",
+                headers={"Retry-After": retry_after(wait)}
+            )
+
     # --- NEW: LOGGING LOGIC (Happens on every successful project hit) ---
     log_payload = {
         "timestamp": time.time(),
@@ -70,57 +280,118 @@ async def handle_mock_request(
         "project_slug": project_slug,
         "headers": dict(request.headers)
     }
-
-    # 2. Publish the payload to Redis
-    redis_client.publish('mockapi:logs', json.dumps(log_payload))
-    print(f"Published log for: {project_slug}{path}")
+    # 2. The record is queued exactly once, with its final status, on the
+    # way out; the log pipeline streams it to Redis in the background.
     # --- END LOGGING LOGIC ---
 
+    # Matching is in-memory, so do it up front: the captured path
+    # parameters are needed by both the state store and the renderer.
+    endpoint, path_params = crud.find_matching_endpoint(project, path=path, method=method)
+
+    # The endpoint's decision table picks which of its responses applies
+    mock_response = None
+    if endpoint:
+        selector = endpoint.selector
+        body = await read_json_body(request) if selector.needs_body else None
+        mock_response = selector.select(request.query_params, request.headers, path_params, body)
+    t = metrics.observe(stages.ENDPOINT_MATCH, t)
+
     # --- STATEFUL LOGIC (Simplified for log clarity) ---
     if method == "POST":
         try:
             body_json = await request.json()
-            crud.add_item_to_state(project.id, path, body_json)
+            await crud.add_item_to_state(project.id, path, body_json, path_params, project.state_limits)
         except json.JSONDecodeError:
             pass
+        except crud.StateBudgetExceeded:
+            log_payload['status'] = status.HTTP_507_INSUFFICIENT_STORAGE
+            finish_request(log_payload, method, started)
+            raise state_full(project_slug)
+        t = metrics.observe(stages.STATE_WRITE, t)
+
+    # Endpoints with a stream mode send stateful collections and rendered
+    # lists chunk by chunk instead of building the whole body.
+    streamed = mock_response if mock_response and mock_response.stream_mode else None
 
     if method == "GET":
-        state_data = crud.get_state_as_list(project.id, path)
-        if state_data:
-            return JSONResponse(
+        # ?limit=, ?offset= and ?cursor= only have to be valid when there's a
+        # collection to page through; other mocks may use them for anything.
+        try:
+            page, page_error = page_from_query(request.query_params), None
+        except HTTPException as e:
+            page, page_error = default_page(), e
+        chunk_size = streaming.chunk_items(streamed.chunk_delay_ms) if streamed else page.limit
+        items_json, total, item_json = await crud.read_state(project.id, path, page.offset, chunk_size)
+        t = metrics.observe(stages.STATE_READ, t)
+        if total and page_error is not None:
+            log_payload['status'] = page_error.status_code
+            finish_request(log_payload, method, started)
+            raise page_error
+        if total and streamed:
+            finish_request(log_payload, method, started)
+            chunks = streaming.state_chunks(project.id, path, items_json, page.offset, total, chunk_size)
+            return streaming.stream_response(200, streamed.stream_mode, chunks, streamed.chunk_delay_ms,
+                                             headers={"X-Total-Count": str(total)})
+        if total:
+            finish_request(log_payload, method, started)
+            response = json_response(
                 status_code=200,
-                content=state_data
+                body=("[" + ",".join(items_json) + "]").encode("utf-8")
             )
+            response.headers.update(page.headers(total))
+            return response
+        if item_json is not None:
+            # e.g. GET /users/42 for an item POSTed to /users
+            finish_request(log_payload, method, started)
+            return json_response(status_code=200, body=item_json.encode("utf-8"))
+
+    if method in ("PUT", "PATCH", "DELETE"):
+        item_path = crud.split_item_path(path)
+        if item_path:
+            try:
+                response = await write_state_item(project.id, method, item_path[0], item_path[1], request,
+                                                  project.state_limits)
+            except crud.StateBudgetExceeded:
+                log_payload['status'] = status.HTTP_507_INSUFFICIENT_STORAGE
+                finish_request(log_payload, method, started)
+                raise state_full(project_slug)
+            t = metrics.observe(stages.STATE_WRITE, t)
+            if response is not None:
+                log_payload['status'] = response.status_code
+                finish_request(log_payload, method, started)
+                return response
 
     # --- Fallback to static/Faker mocks ---
 
-    endpoint = crud.find_matching_endpoint(
-        db,
-        project_id=project.id,
-        path=path,
-        method=method
-    )
-    if not endpoint:
+    if mock_response is None:
         # If endpoint not found, we update the log status before returning 404
         log_payload['status'] = 404
-        redis_client.publish('mockapi:logs', json.dumps(log_payload))
+        finish_request(log_payload, method, started)
 
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No mock endpoint found for {method} {path}"
         )
 
-    # ... (rest of the chaos logic, body parsing, and final JSONResponse return) ...
-    mock_response = endpoint.responses[0]
+    if mock_response.error is not None:
+        log_payload['status'] = 500
+        finish_request(log_payload, method, started)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Mock response can't be rendered: {mock_response.error}"
+        )
+
+    # ... (rest of the chaos logic, body rendering, and final response) ...
 
     # --- CHAOS LOGIC ---
     if mock_response.delay_ms > 0:
         await asyncio.sleep(mock_response.delay_ms / 1000.0)
+        t = metrics.observe(stages.CHAOS_DELAY, t)
 
     if mock_response.failure_rate > 0.0:
         if random.random() < mock_response.failure_rate:
             log_payload['status'] = 500
-            redis_client.publish('mockapi:logs', json.dumps(log_payload))
+            finish_request(log_payload, method, started)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Mock server failure simulation"
@@ -128,24 +399,47 @@ async def handle_mock_request(
 
     # --- Final Response ---
     log_payload['status'] = mock_response.status_code
-    redis_client.publish('mockapi:logs', json.dumps(log_payload))  # Final status log
 
-    raw_body = mock_response.body
+    # Values normally come from the pre-generated pools. A seed renders from
+    # a dedicated Faker instead, reseeded per method and path so each URL is
+    # stable on its own.
+    seed = request.headers.get(SEED_HEADER) or project.faker_seed
+    if mock_response.stream_mode and mock_response.template is not None:
+        finish_request(log_payload, method, started)
+        providers = seeded_providers.for_seed(f"{seed}:{method}:{path}") if seed else value_pool
+        chunks = streaming.template_chunks(
+            mock_response.template, providers, path_params,
+            streaming.chunk_items(mock_response.chunk_delay_ms), seeded=bool(seed)
+        )
+        return streaming.stream_response(mock_response.status_code, mock_response.stream_mode,
+                                         chunks, mock_response.chunk_delay_ms)
 
-    # ... (body parsing logic is the same) ...
-    if raw_body:
-        parsed_body = faker_parser.parse_faker_string(raw_body, faker_instance)
-    else:
-        if method == "POST" and 'body_json' in locals():
-            return JSONResponse(status_code=mock_response.status_code, content=body_json)
-        parsed_body = None
+    # Static bodies were encoded once when the route cache loaded them;
+    # a client that already has this revision just gets a 304.
+    if mock_response.static_body is not None:
+        headers = {"ETag": mock_response.etag}
+        cacheable = method in ("GET", "HEAD") and 200 <= mock_response.status_code < 300
+        if cacheable and etag_matches(request.headers.get("if-none-match"), mock_response.etag):
+            log_payload['status'] = status.HTTP_304_NOT_MODIFIED
+            finish_request(log_payload, method, started)
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        finish_request(log_payload, method, started)
+        response = json_response(status_code=mock_response.status_code, body=mock_response.static_body)
+        response.headers.update(headers)
+        return response
 
-    try:
-        content_body = json.loads(parsed_body)
-    except (json.JSONDecodeError, TypeError):
-        content_body = parsed_body
-
-    return JSONResponse(
-        status_code=mock_response.status_code,
-        content=content_body
-    )
\ No newline at end of file
+    # JSON bodies render straight from their parsed tree into bytes;
+    # see faker_parser.compile_body.
+    if mock_response.template is not None:
+        providers = seeded_providers.for_seed(f"{seed}:{method}:{path}") if seed else value_pool
+        rendered = mock_response.template.render_bytes(providers, path_params)
+        metrics.observe(stages.RENDER, t)
+        finish_request(log_payload, method, started)  # Final status log
+        return json_response(status_code=mock_response.status_code, body=rendered)
+
+    finish_request(log_payload, method, started)  # Final status log
+
+    if method == "POST" and 'body_json' in locals():
+        return json_response(status_code=mock_response.status_code, content=body_json)
+
+    return json_response(status_code=mock_response.status_code, content=None)
\ No newline at end of file
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import time
+from bisect import bisect_left
+
+# Upper bounds (seconds) shared by every latency histogram
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# How often the event-loop lag probe wakes up
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL_MS", "500")) / 1000.0
+
+# Hot-path stages of handle_mock_request
+PROJECT_LOOKUP = "project_lookup"
+RATE_LIMIT = "rate_limit"
+ENDPOINT_MATCH = "endpoint_match"
+STATE_READ = "state_read"
+STATE_WRITE = "state_write"
+RENDER = "render"
+CHAOS_DELAY = "chaos_delay"
+LOG_SUBMIT = "log_submit"
+# Background work, timed off the request path
+LOG_FLUSH = "log_flush"
+TOTAL = "total"
+
+STAGES = (PROJECT_LOOKUP, RATE_LIMIT, ENDPOINT_MATCH, STATE_READ, STATE_WRITE,
+          RENDER, CHAOS_DELAY, LOG_SUBMIT, LOG_FLUSH, TOTAL)
+
+# Requests for slugs that don't exist share one label, so bad URLs can't
+# create new series
+UNKNOWN_PROJECT = "_unknown"
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect and two additions into
+    preallocated slots; buckets are only made cumulative when exported.
+    """
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list:
+        sep = "," if labels else ""
+        out = []
+        running = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            running += count
+            out.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {running}')
+        out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{suffix} {self.sum}")
+        out.append(f"{name}_count{suffix} {self.count}")
+        return out
+
+
+class Metrics:
+    """In-process metrics for the mock engine, exported on /metrics."""
+
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in STAGES}
+        # (project, method, status) -> count
+        self.requests = {}
+        self.loop_lag = Histogram()
+        self.loop_lag_last = 0.0
+        # name -> zero-argument callable returning {metric: value}; read at export
+        self._collectors = {}
+        self._task = None
+
+    def observe(self, stage: str, started: float) -> float:
+        """Records the time since `started` (a perf_counter value); returns now."""
+        now = time.perf_counter()
+        self.stages[stage].observe(now - started)
+        return now
+
+    def count_request(self, project: str, method: str, status: int):
+        key = (project, method, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def add_collector(self, name: str, collect):
+        self._collectors[name] = collect
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.probe_loop_lag())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def probe_loop_lag(self):
+        """How late a timer fires is how long other work held the event loop."""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(time.perf_counter() - started - LOOP_LAG_INTERVAL, 0.0)
+            self.loop_lag_last = lag
+            self.loop_lag.observe(lag)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        out = [
+            "# HELP mock_engine_stage_seconds Time spent in each stage of a mock request.",
+            "# TYPE mock_engine_stage_seconds histogram",
+        ]
+        for stage, histogram in self.stages.items():
+            out.extend(histogram.lines("mock_engine_stage_seconds", f'stage="{stage}"'))
+
+        out.append("# HELP mock_engine_requests_total Mock requests by project, method and status.")
+        out.append("# TYPE mock_engine_requests_total counter")
+        for (project, method, status), count in self.requests.items():
+            out.append(f'mock_engine_requests_total{{project="{project}",method="{method}",status="{status}"}} {count}')
+
+        out.append("# HELP mock_engine_event_loop_lag_seconds Event loop scheduling delay.")
+        out.append("# TYPE mock_engine_event_loop_lag_seconds histogram")
+        out.extend(self.loop_lag.lines("mock_engine_event_loop_lag_seconds", ""))
+        out.append("# TYPE mock_engine_event_loop_lag_last_seconds gauge")
+        out.append(f"mock_engine_event_loop_lag_last_seconds {self.loop_lag_last}")
+
+        for name, collect in self._collectors.items():
+            try:
+                values = collect()
+            except Exception as e:
+                out.append(f"# {name} collector failed: {e}")
+                continue
+            for metric, value in values.items():
+                kind = "counter" if metric.endswith("_total") else "gauge"
+                out.append(f"# TYPE mock_engine_{name}_{metric} {kind}")
+                out.append(f"mock_engine_{name}_{metric} {value}")
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
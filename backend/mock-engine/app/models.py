@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, Float, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -9,6 +9,8 @@ import enum
 class Organization(Base):
     __tablename__ = "organizations"
     id = Column(Integer, primary_key=True)
+    rate_limit_rps = Column(Float)
+    rate_limit_burst = Column(Integer)
     projects = relationship("Project", back_populates="organization")
 
 
@@ -17,6 +19,12 @@ class Project(Base):
     id = Column(Integer, primary_key=True)
     url_slug = Column(String(255), unique=True, index=True, nullable=False)
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
+    faker_seed = Column(String(64))
+    rate_limit_rps = Column(Float)
+    rate_limit_burst = Column(Integer)
+    state_max_items = Column(Integer)
+    state_max_bytes = Column(Integer)
+    state_ttl_s = Column(Integer)
     organization = relationship("Organization", back_populates="projects")
     endpoints = relationship("Endpoint", back_populates="project")
 
@@ -33,6 +41,18 @@ class HttpMethod(enum.Enum):
     HEAD = "HEAD"
 
 
+class SelectionMode(enum.Enum):
+    first = "first"
+    weighted = "weighted"
+    round_robin = "round_robin"
+
+
+class StreamMode(enum.Enum):
+    json_array = "json_array"
+    ndjson = "ndjson"
+    sse = "sse"
+
+
 class Endpoint(Base):
     __tablename__ = "endpoints"
 
@@ -42,6 +62,8 @@ class Endpoint(Base):
     method = Column(Enum(HttpMethod), nullable=False)
     path = Column(String(2048), nullable=False)
     description = Column(String(500))
+    # Picks among responses without a rule (see Response.rule)
+    selection = Column(Enum(SelectionMode), default=SelectionMode.first)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     project = relationship("Project", back_populates="endpoints")
@@ -61,4 +83,15 @@ class Response(Base):
     delay_ms = Column(Integer, default=0)
     failure_rate = Column(Float, default=0.0)
 
+    # --- STREAMING COLUMNS ---
+    # NULL sends the body in one piece
+    stream_mode = Column(Enum(StreamMode))
+    chunk_delay_ms = Column(Integer, default=0)
+
+    # --- SELECTION COLUMNS ---
+    # e.g. {"query": {"status": "active"}, "headers": {"X-Scenario": "error"}};
+    # responses with a matching rule are served before any without one
+    rule = Column(JSON)
+    weight = Column(Integer, default=1)
+
     endpoint = relationship("Endpoint", back_populates="responses")
\ No newline at end of file
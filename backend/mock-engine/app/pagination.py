@@ -0,0 +1,80 @@
+import base64
+import os
+from fastapi import HTTPException, status
+
+# Stateful GETs return at most this many items unless ?limit= says otherwise
+STATE_PAGE_SIZE = int(os.getenv("STATE_PAGE_SIZE", "100"))
+STATE_MAX_PAGE_SIZE = int(os.getenv("STATE_MAX_PAGE_SIZE", "1000"))
+
+
+class Page:
+    __slots__ = ("offset", "limit")
+
+    def __init__(self, offset: int, limit: int):
+        self.offset = offset
+        self.limit = limit
+
+    def next_cursor(self, total: int) -> str | None:
+        """Cursor for the following page, or None if this is the last one."""
+        next_offset = self.offset + self.limit
+        if self.limit == 0 or next_offset >= total:
+            return None
+        return encode_cursor(next_offset)
+
+    def headers(self, total: int) -> dict:
+        headers = {"X-Total-Count": str(total)}
+        cursor = self.next_cursor(total)
+        if cursor is not None:
+            headers["X-Next-Cursor"] = cursor
+        return headers
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        kind, _, value = base64.urlsafe_b64decode(padded).decode().partition(":")
+        offset = int(value)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if kind != "o" or offset < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return offset
+
+
+def _non_negative_int(query_params, name: str, default: int) -> int:
+    raw = query_params.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"'{name}' must be a non-negative integer"
+        )
+    return value
+
+
+def default_page() -> Page:
+    return Page(offset=0, limit=STATE_PAGE_SIZE)
+
+
+def page_from_query(query_params) -> Page:
+    """
+    Reads ?limit=&offset= or ?limit=&cursor= from the request.
+    A cursor takes precedence over offset. Raises a 400 HTTPException
+    for values that aren't valid.
+    """
+    limit = min(_non_negative_int(query_params, "limit", STATE_PAGE_SIZE), STATE_MAX_PAGE_SIZE)
+    cursor = query_params.get("cursor")
+    if cursor:
+        offset = decode_cursor(cursor)
+    else:
+        offset = _non_negative_int(query_params, "offset", 0)
+    return Page(offset=offset, limit=limit)
@@ -0,0 +1,160 @@
+import math
+import os
+import time
+from .database import redis_client
+
+# Each Redis round trip leases about this much of a bucket's refill rate,
+# which is then spent locally without touching Redis.
+RATE_LIMIT_LEASE_MS = float(os.getenv("RATE_LIMIT_LEASE_MS", "100"))
+# Leased tokens left unspent after this long are given up
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL_MS", "1000")) / 1000.0
+
+RATE_LIMIT_PREFIX = "ratelimit:"
+
+# Token buckets: each refills `rate` tokens per second up to `burst`.
+# A request has to pass every bucket it's subject to (the project's and
+# its org's), so the script refills them all, grants the fewest tokens any
+# of them holds (at most ARGV[1]) and spends that from each: a bucket
+# never pays for a request another one denied. Uses the Redis clock so
+# every engine process agrees on time.
+# KEYS: one per bucket   ARGV: wanted, then rate and burst for each key.
+# Returns {granted, ms until every bucket has a token if nothing was granted}.
+TAKE_SCRIPT = redis_client.register_script("""
+local wanted = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+
+local tokens = {}
+local granted = wanted
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[i * 2]), tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available, ts = tonumber(bucket[1]), tonumber(bucket[2])
+    if available == nil or ts == nil then
+        available = burst
+        ts = now
+    end
+    tokens[i] = math.min(burst, available + math.max(now - ts, 0) * rate / 1000)
+    granted = math.min(granted, math.floor(tokens[i]))
+end
+
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[i * 2]), tonumber(ARGV[i * 2 + 1])
+    local left = tokens[i] - granted
+    redis.call('HSET', key, 'tokens', tostring(left), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst * 1000 / rate) + 1000)
+    if granted == 0 and left < 1 then
+        wait = math.max(wait, math.ceil((1 - left) * 1000 / rate))
+    end
+end
+return {granted, wait}
+""")
+
+
+class Lease:
+    __slots__ = ("tokens", "expires", "blocked_until")
+
+    def __init__(self):
+        self.tokens = 0
+        self.expires = 0.0
+        self.blocked_until = 0.0
+
+
+class RateLimiter:
+    """
+    Per-project and per-organization token buckets shared by all engine
+    processes through Redis.
+
+    Each process leases small batches of tokens (from all of a project's
+    buckets at once) and spends them locally, so a project well under its
+    limits costs one Redis call per lease rather than per request. A
+    denial is remembered locally until the next token is due, so a flood
+    of over-limit requests doesn't hit Redis either.
+    """
+
+    def __init__(self):
+        # project id -> Lease; ones that have run out are pruned now and then
+        self._leases = {}
+        self._next_prune = 0.0
+        self.redis_calls = 0
+        self.limited = 0
+        self.errors = 0
+        self._failing = False
+
+    def stats(self) -> dict:
+        return {
+            "leases": len(self._leases),
+            "redis_calls_total": self.redis_calls,
+            "limited_total": self.limited,
+            "errors_total": self.errors,
+        }
+
+    async def check(self, project) -> float | None:
+        """Returns seconds to wait if the request is over a limit, else None."""
+        wait = await self._take(project.id, project.rate_limits, time.monotonic())
+        if wait is not None:
+            self.limited += 1
+        return wait
+
+    async def _take(self, project_id: int, limits: tuple, now: float) -> float | None:
+        lease = self._leases.get(project_id)
+        if lease is None:
+            lease = self._leases[project_id] = Lease()
+        if now < lease.blocked_until:
+            return lease.blocked_until - now
+        if lease.tokens > 0 and now < lease.expires:
+            lease.tokens -= 1
+            return None
+
+        if now >= self._next_prune:
+            self._prune(now)
+        wanted = max(1, min(min(burst, int(rate * RATE_LIMIT_LEASE_MS / 1000.0)) for _, rate, burst in limits))
+        args = [wanted]
+        for _, rate, burst in limits:
+            args += [rate, burst]
+        try:
+            self.redis_calls += 1
+            granted, wait_ms = await TAKE_SCRIPT(
+                keys=[RATE_LIMIT_PREFIX + key for key, _, _ in limits],
+                args=args,
+                client=redis_client
+            )
+        except Exception as e:
+            # Fail open: a Redis outage shouldn't take every mock down with it.
+            # Failures are counted in errors; only the first of a run is logged.
+            self.errors += 1
+            if not self._failing:
+                self._failing = True
+                print(f"Rate limit checks failing, letting requests through: {e}")
+            return None
+        if self._failing:
+            self._failing = False
+            print("Rate limit checks recovered.")
+
+        # A prune while we waited may have dropped this (then empty) lease
+        self._leases[project_id] = lease
+        granted = int(granted)
+        if granted == 0:
+            lease.tokens = 0
+            lease.blocked_until = now + int(wait_ms) / 1000.0
+            return int(wait_ms) / 1000.0
+        lease.tokens = granted - 1
+        lease.expires = now + RATE_LIMIT_LEASE_TTL
+        return None
+
+    def _prune(self, now: float):
+        """Forgets leases with no tokens or block left; they'd go to Redis next anyway."""
+        self._leases = {
+            project_id: lease for project_id, lease in self._leases.items()
+            if now < lease.blocked_until or (lease.tokens > 0 and now < lease.expires)
+        }
+        self._next_prune = now + RATE_LIMIT_LEASE_TTL
+
+
+def retry_after(wait: float) -> str:
+    """Retry-After takes whole seconds; never tell a client to retry at once."""
+    return str(max(1, math.ceil(wait)))
+
+
+rate_limiter = RateLimiter()
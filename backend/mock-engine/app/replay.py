@@ -0,0 +1,129 @@
+"""
+Re-sends traffic recorded with CAPTURE_PATH to a mock engine.
+
+    python -m app.replay capture.ndjson --target http://localhost:8001
+    python -m app.replay capture.ndjson --speed 10 --concurrency 200
+    python -m app.replay capture.ndjson --speed 0 --slug staging-copy
+
+Requests keep their recorded spacing, divided by --speed; --speed 0
+sends them as fast as --concurrency allows.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+import httpx
+import orjson
+from .capture import record_body
+
+
+def read_records(path: str):
+    """Captured records in file order, read lazily; unreadable lines are skipped."""
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # e.g. a line cut short when the engine stopped
+
+
+class Replay:
+    def __init__(self, target: str, speed: float, concurrency: int, slug: str | None = None):
+        self.speed = speed
+        self.slug = slug
+        self._slots = asyncio.Semaphore(concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=target.rstrip("/"),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=httpx.Timeout(30.0),
+        )
+        self.statuses = Counter()
+        self.errors = 0
+        self.latencies = []
+        # How far behind the recorded schedule requests went out
+        self.max_lag = 0.0
+
+    async def run(self, records) -> float:
+        tasks = set()
+        started = time.perf_counter()
+        first_ts = None
+        async with self._client:
+            for record in records:
+                if first_ts is None:
+                    first_ts = record["ts"]
+                if self.speed > 0:
+                    due = started + (record["ts"] - first_ts) / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        self.max_lag = max(self.max_lag, -delay)
+                await self._slots.acquire()
+                task = asyncio.create_task(self._send(record))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    async def _send(self, record: dict):
+        slug = self.slug or record["slug"]
+        url = f"/mock/{slug}{record['path']}"
+        if record.get("query"):
+            url += "?" + record["query"]
+        try:
+            sent = time.perf_counter()
+            response = await self._client.request(
+                record["method"], url, headers=record.get("headers"), content=record_body(record)
+            )
+            self.latencies.append(time.perf_counter() - sent)
+            self.statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            self.errors += 1
+            if self.errors <= 10:
+                print(f"{record['method']} {url} failed: {e!r}", file=sys.stderr)
+        finally:
+            self._slots.release()
+
+    def summary(self, elapsed: float) -> str:
+        sent = sum(self.statuses.values()) + self.errors
+        ordered = sorted(self.latencies)
+
+        def percentile(p):
+            if not ordered:
+                return "-"
+            return f"{ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000:.1f}ms"
+
+        statuses = ", ".join(f"{code}: {count}" for code, count in sorted(self.statuses.items()))
+        return (
+            f"{sent} requests in {elapsed:.2f}s ({sent / elapsed if elapsed else 0:.1f} req/s)\n"
+            f"statuses: {statuses or '-'}; errors: {self.errors}\n"
+            f"latency p50 {percentile(50)}, p95 {percentile(95)}, p99 {percentile(99)}; "
+            f"max lag behind schedule {self.max_lag * 1000:.1f}ms"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.replay", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="file written by the engine with CAPTURE_PATH set")
+    parser.add_argument("--target", default="http://localhost:8001", help="mock engine base URL")
+    parser.add_argument("--speed", type=float, default=1.0, help="timing multiplier; 0 = no delays")
+    parser.add_argument("--concurrency", type=int, default=50, help="most requests in flight at once")
+    parser.add_argument("--slug", help="send everything to this project instead of the recorded one")
+    args = parser.parse_args(argv)
+    if args.speed < 0 or args.concurrency < 1:
+        parser.error("--speed must be >= 0 and --concurrency >= 1")
+
+    async def replay():
+        runner = Replay(args.target, args.speed, args.concurrency, args.slug)
+        elapsed = await runner.run(read_records(args.capture))
+        print(runner.summary(elapsed))
+        return 1 if runner.errors else 0
+
+    return asyncio.run(replay())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import zlib
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from . import models, faker_parser
+from .crud import StateLimits
+from .database import SessionLocal, redis_client, CONFIG_CHANNEL
+from .router import RouteTrie
+from .selection import FIRST, ResponseSelector
+
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "1024"))
+
+
+# --- Compiled Config ---
+# Plain, read-only snapshots of the DB rows. They are detached from any
+# session, so serving a request from them never touches the database.
+
+class CompiledResponse:
+    __slots__ = ("id", "version", "status_code", "body", "delay_ms", "failure_rate", "weight",
+                 "stream_mode", "chunk_delay_ms", "template", "static_body", "etag", "error")
+
+    def __init__(self, response: models.Response):
+        self.id = response.id
+        self.status_code = response.status_code
+        self.body = response.body
+        # Identifies this revision of the body in the template cache
+        self.version = zlib.crc32(response.body.encode("utf-8")) if response.body else 0
+        self.delay_ms = response.delay_ms or 0
+        self.failure_rate = response.failure_rate or 0.0
+        self.weight = response.weight if response.weight is not None else 1
+        self.stream_mode = response.stream_mode.value if response.stream_mode else None
+        self.chunk_delay_ms = response.chunk_delay_ms or 0
+
+        # Bodies without tags render the same every time: keep the final
+        # bytes and a strong ETag so hits skip the renderer entirely.
+        self.template = None
+        self.static_body = None
+        self.etag = None
+        # Why the body can't be served, e.g. $repeat lists over the limit
+        self.error = None
+        if response.body:
+            # One body that can't be precomputed mustn't fail the whole
+            # project's load; it is rendered per request instead.
+            try:
+                self.template = faker_parser.get_template(self.id, self.version, response.body)
+                if self.template.is_static:
+                    self.static_body = self.template.render_bytes(None)
+                    self.etag = '"' + hashlib.blake2b(self.static_body, digest_size=16).hexdigest() + '"'
+            except ValueError as e:
+                self.template = None
+                self.error = str(e)
+            except Exception as e:
+                print(f"Could not precompute response {self.id}: {e}")
+                self.static_body = None
+                self.etag = None
+
+
+class CompiledEndpoint:
+    __slots__ = ("id", "method", "path", "responses", "selector")
+
+    def __init__(self, endpoint: models.Endpoint):
+        self.id = endpoint.id
+        self.method = endpoint.method.value
+        self.path = endpoint.path
+        rows = sorted(endpoint.responses, key=lambda r: r.id)
+        self.responses = [CompiledResponse(r) for r in rows]
+        mode = endpoint.selection.value if endpoint.selection else FIRST
+        self.selector = ResponseSelector([(compiled, row.rule) for compiled, row in zip(self.responses, rows)], mode)
+
+
+class CompiledProject:
+    __slots__ = ("id", "organization_id", "slug", "faker_seed", "rate_limits", "state_limits", "routes")
+
+    def __init__(self, project: models.Project):
+        self.id = project.id
+        self.organization_id = project.organization_id
+        self.slug = project.url_slug
+        self.faker_seed = project.faker_seed
+        # (bucket key, tokens per second, burst) for each configured limit
+        self.rate_limits = tuple(
+            (key, rps, burst or max(1, math.ceil(rps)))
+            for key, rps, burst in (
+                (f"project:{project.id}", project.rate_limit_rps, project.rate_limit_burst),
+                (f"org:{project.organization_id}", project.organization.rate_limit_rps,
+                 project.organization.rate_limit_burst),
+            )
+            if rps and rps > 0
+        )
+        self.state_limits = StateLimits(project.state_max_items, project.state_max_bytes, project.state_ttl_s)
+        # method -> RouteTrie; for duplicate templates the lowest id wins
+        self.routes = {}
+        for endpoint in sorted(project.endpoints, key=lambda e: e.id):
+            compiled = CompiledEndpoint(endpoint)
+            trie = self.routes.setdefault(compiled.method, RouteTrie())
+            try:
+                trie.insert(compiled.path, compiled)
+            except ValueError as e:
+                print(f"Skipping endpoint {compiled.id}: {e}")
+
+    def find_endpoint(self, path: str, method: str):
+        """Returns (endpoint, path_params), or (None, {}) if nothing matches."""
+        trie = self.routes.get(method)
+        match = trie.match(path) if trie is not None else None
+        if match is None:
+            return None, {}
+        return match
+
+
+# --- LRU Cache ---
+
+class RouteCache:
+    """
+    Per-process LRU of slug -> CompiledProject (or None for unknown slugs).
+    Entries live until manager-api tells us they changed.
+    """
+
+    def __init__(self, maxsize: int = ROUTE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # slug -> Future, so a burst of misses for one slug runs one query
+        self._loading = {}
+        # Bumped on every invalidation so a load that raced with one
+        # doesn't put stale config back into the cache.
+        self._generation = 0
+
+    def stats(self) -> dict:
+        return {"projects": len(self._entries), "loading": len(self._loading)}
+
+    async def get(self, slug: str):
+        if slug in self._entries:
+            self._entries.move_to_end(slug)
+            return self._entries[slug]
+
+        pending = self._loading.get(slug)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this request was cancelled
+                # The load was cancelled along with the request running it
+                return await self.get(slug)
+
+        generation = self._generation
+        pending = asyncio.get_running_loop().create_future()
+        self._loading[slug] = pending
+        try:
+            project = await self._load(slug)
+        except Exception as e:
+            pending.set_exception(e)
+            # Mark it retrieved so a failure nobody was waiting on isn't logged at GC.
+            pending.exception()
+            raise
+        except BaseException:
+            # Cancelled, e.g. the client disconnected: release the waiters
+            pending.cancel()
+            raise
+        finally:
+            if self._loading.get(slug) is pending:
+                del self._loading[slug]
+
+        pending.set_result(project)
+        if generation == self._generation:
+            self._entries[slug] = project
+            self._entries.move_to_end(slug)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return project
+
+    async def _load(self, slug: str):
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(models.Project)
+                .options(selectinload(models.Project.endpoints).selectinload(models.Endpoint.responses),
+                         joinedload(models.Project.organization))
+                .filter(models.Project.url_slug == slug)
+            )
+            project = result.scalars().first()
+            return CompiledProject(project) if project else None
+
+    def invalidate(self, project_id: int | None = None, slug: str | None = None,
+                   organization_id: int | None = None):
+        self._generation += 1
+        # In-flight loads may have read the old rows; let the next caller reload.
+        self._loading.clear()
+        if slug is not None:
+            self._entries.pop(slug, None)
+        if project_id is not None or organization_id is not None:
+            for key, project in list(self._entries.items()):
+                if project is not None and (project.id == project_id or project.organization_id == organization_id):
+                    del self._entries[key]
+
+    def clear(self):
+        self._generation += 1
+        self._loading.clear()
+        self._entries.clear()
+
+
+route_cache = RouteCache()
+
+
+# --- Invalidation Listener ---
+
+async def listen_for_changes():
+    """Long-running task: drops cached projects as manager-api announces changes."""
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(CONFIG_CHANNEL)
+            # Anything published while we were disconnected is lost, so start clean.
+            route_cache.clear()
+            async for message in pubsub.listen():
+                try:
+                    change = json.loads(message["data"])
+                except (json.JSONDecodeError, TypeError):
+                    route_cache.clear()
+                    continue
+                route_cache.invalidate(project_id=change.get("project_id"), slug=change.get("slug"),
+                                       organization_id=change.get("organization_id"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Config listener lost Redis connection: {e}")
+            route_cache.clear()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
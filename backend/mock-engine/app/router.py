@@ -0,0 +1,112 @@
+# Segment-level radix trie used to match request paths against endpoint
+# path templates, e.g. "/users/{id}" or "/files/{rest:path}".
+
+WILDCARD_SEGMENT = "*"
+
+
+def parse_segment(segment: str):
+    """
+    Classifies one template segment.
+    Returns ("static", text), ("param", name) or ("wildcard", name).
+    """
+    if segment == WILDCARD_SEGMENT:
+        return "wildcard", "path"
+    if segment.startswith("{") and segment.endswith("}"):
+        name = segment[1:-1].strip()
+        if name.endswith(":path"):
+            return "wildcard", name[:-len(":path")]
+        return "param", name
+    return "static", segment
+
+
+def split_path(path: str) -> list:
+    return [segment for segment in path.split("/") if segment]
+
+
+class RouteNode:
+    __slots__ = ("static", "param", "wildcard", "endpoint")
+
+    def __init__(self):
+        self.static = {}       # segment text -> RouteNode
+        self.param = None      # RouteNode for "{name}" segments
+        self.wildcard = None   # (endpoint, param_names) for a trailing "{name:path}" / "*"
+        self.endpoint = None   # (endpoint, param_names) when a template ends here
+
+
+class RouteTrie:
+    """
+    All templates for one HTTP method. Built once per project, then every
+    lookup walks one node per path segment.
+
+    Precedence at each segment is static > {param} > trailing wildcard, so an
+    exact path like "/users/me" always beats "/users/{id}".
+    """
+
+    def __init__(self):
+        self.root = RouteNode()
+
+    def insert(self, template: str, endpoint) -> bool:
+        """Adds a template. Returns False if an earlier endpoint already owns it."""
+        node = self.root
+        names = []
+        segments = split_path(template)
+        for index, segment in enumerate(segments):
+            kind, value = parse_segment(segment)
+            if kind == "wildcard":
+                if index != len(segments) - 1:
+                    raise ValueError(f"Wildcard must be the last segment in '{template}'")
+                if node.wildcard is not None:
+                    return False
+                node.wildcard = (endpoint, tuple(names + [value]))
+                return True
+            if kind == "param":
+                if node.param is None:
+                    node.param = RouteNode()
+                node = node.param
+                names.append(value)
+            else:
+                node = node.static.setdefault(value, RouteNode())
+
+        if node.endpoint is not None:
+            return False
+        node.endpoint = (endpoint, tuple(names))
+        return True
+
+    def match(self, path: str):
+        """Returns (endpoint, params) for the best match, or None."""
+        segments = split_path(path)
+        values = []
+        found = self._match(self.root, segments, 0, values)
+        if found is None:
+            return None
+        (endpoint, names), captured = found
+        return endpoint, dict(zip(names, captured))
+
+    def _match(self, node: RouteNode, segments: list, index: int, values: list):
+        if index == len(segments):
+            if node.endpoint is not None:
+                return node.endpoint, list(values)
+            if node.wildcard is not None:
+                # Like FastAPI's ":path" converter, a wildcard may match nothing.
+                return node.wildcard, values + [""]
+            return None
+
+        segment = segments[index]
+
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, values)
+            if found is not None:
+                return found
+
+        if node.param is not None:
+            values.append(segment)
+            found = self._match(node.param, segments, index + 1, values)
+            values.pop()
+            if found is not None:
+                return found
+
+        if node.wildcard is not None:
+            return node.wildcard, values + ["/".join(segments[index:])]
+
+        return None
@@ -0,0 +1,148 @@
+import itertools
+import random
+from bisect import bisect_right
+
+# Where a rule condition looks for its value
+RULE_SOURCES = ("query", "headers", "params", "body")
+
+# Rules testing the same fields are compiled into one dict keyed by those
+# fields' values, as long as expanding "any of" lists stays this small.
+MAX_TABLE_ENTRIES = 4096
+
+FIRST = "first"
+WEIGHTED = "weighted"
+ROUND_ROBIN = "round_robin"
+
+
+def rule_value(value) -> str | None:
+    """Normalizes rule and request values so "1", 1 and true compare sensibly."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def compile_conditions(rule: dict):
+    """
+    {"query": {"status": "active"}, "body": {"user.role": ["admin", "owner"]}}
+    -> ((("query", "status"), {"active"}), (("body", "user.role"), {...})).
+    Returns None for a malformed rule, which then never matches.
+    """
+    conditions = []
+    for source, fields in rule.items():
+        if source not in RULE_SOURCES or not isinstance(fields, dict):
+            return None
+        for name, expected in fields.items():
+            if source == "headers":
+                name = name.lower()
+            values = expected if isinstance(expected, list) else [expected]
+            conditions.append(((source, name), frozenset(rule_value(v) for v in values)))
+    return tuple(sorted(conditions, key=lambda c: c[0]))
+
+
+def body_field(body, dotted: str):
+    value = body
+    for part in dotted.split("."):
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def request_value(field, query, headers, params, body):
+    source, name = field
+    if source == "query":
+        return query.get(name)
+    if source == "headers":
+        return headers.get(name)
+    if source == "params":
+        return params.get(name) if params else None
+    return rule_value(body_field(body, name))
+
+
+class ResponseSelector:
+    """
+    Per-endpoint decision table, built once when the route cache loads the
+    endpoint.
+
+    Responses with a rule are checked first, in id order, and the first
+    whose conditions all match wins. If every rule tests the same fields
+    the rules become a single dict lookup on those fields' values.
+    Requests matching no rule get one of the rule-less responses, chosen by
+    the endpoint's selection mode: the first one, weighted random, or
+    round robin.
+    """
+    __slots__ = ("mode", "fields", "table", "rules", "fallback", "cumulative", "cycle", "needs_body")
+
+    def __init__(self, responses: list, mode: str = FIRST):
+        self.mode = mode
+        rules = []
+        fallback = []
+        for response, rule in responses:
+            if rule:
+                conditions = compile_conditions(rule)
+                if conditions:
+                    rules.append((conditions, response))
+            else:
+                fallback.append(response)
+        # With nothing rule-less to fall back on, behave as before: first response
+        self.fallback = fallback or [response for response, _ in responses[:1]]
+
+        self.rules = rules
+        self.needs_body = any(field[0] == "body" for conditions, _ in rules for field, _ in conditions)
+        self.fields, self.table = self._build_table(rules)
+
+        weights = [max(getattr(response, "weight", 1), 0) for response in self.fallback]
+        self.cumulative = list(itertools.accumulate(weights)) if any(weights) else None
+        self.cycle = itertools.cycle(self.fallback) if self.fallback else None
+
+    @staticmethod
+    def _build_table(rules):
+        if not rules:
+            return (), None
+        fields = tuple(field for field, _ in rules[0][0])
+        entries = 0
+        for conditions, _ in rules:
+            if tuple(field for field, _ in conditions) != fields:
+                return (), None
+            size = 1
+            for _, values in conditions:
+                size *= len(values)
+            entries += size
+        if entries > MAX_TABLE_ENTRIES:
+            return (), None
+
+        table = {}
+        for conditions, response in rules:
+            for key in itertools.product(*(values for _, values in conditions)):
+                table.setdefault(key, response)  # earlier rules win
+        return fields, table
+
+    def select(self, query, headers, params, body=None):
+        if self.table is not None:
+            key = tuple(request_value(field, query, headers, params, body) for field in self.fields)
+            response = self.table.get(key)
+            if response is not None:
+                return response
+        elif self.rules:
+            for conditions, response in self.rules:
+                if all(request_value(field, query, headers, params, body) in values
+                       for field, values in conditions):
+                    return response
+
+        if not self.fallback:
+            return None
+        if self.mode == ROUND_ROBIN:
+            return next(self.cycle)
+        if self.mode == WEIGHTED and self.cumulative is not None:
+            point = random.random() * self.cumulative[-1]
+            return self.fallback[bisect_right(self.cumulative, point)]
+        return self.fallback[0]
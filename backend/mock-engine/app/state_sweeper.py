@@ -0,0 +1,75 @@
+import asyncio
+import os
+from . import crud
+from .database import redis_client
+
+# How often the sweeper looks for generations retired by a reset
+STATE_SWEEP_INTERVAL = float(os.getenv("STATE_SWEEP_INTERVAL_S", "5"))
+# Keys per UNLINK, so no single call holds Redis for long
+STATE_SWEEP_BATCH = int(os.getenv("STATE_SWEEP_BATCH", "500"))
+
+
+class StateSweeper:
+    """
+    Deletes the keys of state generations that resets have retired, in
+    the background. Each retired generation is claimed with SPOP, so with
+    several engine processes every one is swept exactly once. UNLINK
+    frees the memory off Redis's main thread.
+
+    Only collections still counted in the generation's usage hash are
+    found this way; anything else (e.g. the seq of a collection whose
+    items were all deleted) expires through its TTL.
+    """
+
+    def __init__(self):
+        self._task = None
+        self.generations = 0
+        self.keys = 0
+
+    def stats(self) -> dict:
+        return {"generations_total": self.generations, "keys_total": self.keys}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        """Long-running sweep loop; start it once per process."""
+        while True:
+            await asyncio.sleep(STATE_SWEEP_INTERVAL)
+            try:
+                while await self.sweep_one():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"State sweep failed: {e}")
+
+    async def sweep_one(self) -> bool:
+        """Deletes one retired generation. Returns False when there are none left."""
+        entry = await redis_client.spop(crud.STATE_GC_KEY)
+        if entry is None:
+            return False
+        project_id, _, generation = entry.partition(":")
+        ns = crud.state_namespace(int(project_id), int(generation))
+        usage = f"{ns}usage"
+        paths = [path for path in await redis_client.hkeys(usage) if path.startswith("/")]
+        keys = [f"{ns}{path}:{suffix}" for path in paths for suffix in ("items", "order", "seq")]
+        keys.append(usage)
+        for start in range(0, len(keys), STATE_SWEEP_BATCH):
+            self.keys += await redis_client.unlink(*keys[start:start + STATE_SWEEP_BATCH])
+            await asyncio.sleep(0)
+        self.generations += 1
+        return True
+
+
+state_sweeper = StateSweeper()
@@ -0,0 +1,100 @@
+import asyncio
+import os
+from fastapi.responses import StreamingResponse
+from . import crud
+from .faker_parser import dump_json
+
+# Items rendered (or read from the state store) per chunk; a response with
+# a chunk delay sends every item as its own chunk instead.
+STREAM_CHUNK_ITEMS = int(os.getenv("STREAM_CHUNK_ITEMS", "100"))
+
+JSON_ARRAY = "json_array"
+NDJSON = "ndjson"
+SSE = "sse"
+
+MEDIA_TYPES = {
+    JSON_ARRAY: "application/json",
+    NDJSON: "application/x-ndjson",
+    SSE: "text/event-stream",
+}
+
+
+def chunk_items(chunk_delay_ms: int) -> int:
+    return 1 if chunk_delay_ms > 0 else STREAM_CHUNK_ITEMS
+
+
+def encode_chunk(mode: str, items: list, first: bool) -> bytes:
+    """items are already JSON-encoded (bytes)."""
+    if mode == NDJSON:
+        return b"".join(item + b"\n" for item in items)
+    if mode == SSE:
+        return b"".join(b"data: " + item + b"\n\n" for item in items)
+    body = b",".join(items)
+    return body if first else b"," + body
+
+
+async def stream_body(mode: str, chunks, chunk_delay_ms: int):
+    """
+    Turns an async iterator of encoded item lists into the response body.
+    Only the current chunk is held in memory.
+    """
+    delay = chunk_delay_ms / 1000.0
+    first = True
+    if mode == JSON_ARRAY:
+        yield b"["
+    async for items in chunks:
+        if not items:
+            continue
+        if delay and not first:
+            await asyncio.sleep(delay)
+        yield encode_chunk(mode, items, first)
+        first = False
+    if mode == JSON_ARRAY:
+        yield b"]"
+
+
+def stream_response(status_code: int, mode: str, chunks, chunk_delay_ms: int = 0, headers: dict | None = None):
+    return StreamingResponse(
+        stream_body(mode, chunks, chunk_delay_ms),
+        status_code=status_code,
+        media_type=MEDIA_TYPES[mode],
+        headers=headers,
+    )
+
+
+def template_chunks(template, providers, params: dict | None, size: int, seeded: bool = False):
+    """
+    Renders a template's items chunk by chunk. The shared seeded Faker may
+    be reseeded by other requests between chunks, so a seeded stream keeps
+    its own random state (taken now, before anything else can reseed it)
+    and puts it back before each chunk.
+    """
+    state = providers.random.getstate() if seeded else None
+    return _template_chunks(template.iter_items(providers, params, size), providers, state)
+
+
+async def _template_chunks(items, providers, state):
+    while True:
+        if state is not None:
+            providers.random.setstate(state)
+        chunk = next(items, None)
+        if chunk is None:
+            return
+        if state is not None:
+            state = providers.random.getstate()
+        yield [dump_json(item) for item in chunk]
+        await asyncio.sleep(0)  # let other requests run between chunks
+
+
+async def state_chunks(project_id: int, path: str, first_page: list, offset: int, total: int, size: int):
+    """
+    A stateful collection, one page per round trip, starting from a page
+    the caller already read.
+    """
+    page = first_page
+    while page:
+        yield [item.encode("utf-8") for item in page]
+        offset += size
+        if offset >= total:
+            return
+        page, total, _ = await crud.read_state(project_id, path, offset, size)
@@ -0,0 +1,208 @@
+import asyncio
+import os
+import random
+from faker import Faker
+from .faker_parser import ProviderTable, call_provider
+
+# Pre-generated values kept per Faker provider; 0 turns pooling off
+VALUE_POOL_SIZE = int(os.getenv("VALUE_POOL_SIZE", "512"))
+# A ring is topped up once fewer than this share of its values are unread
+VALUE_POOL_LOW_WATER = float(os.getenv("VALUE_POOL_LOW_WATER", "0.5"))
+# The refill worker also wakes up on its own this often
+VALUE_POOL_REFILL_INTERVAL = float(os.getenv("VALUE_POOL_REFILL_MS", "200")) / 1000.0
+# At most this many providers get a ring; any others are called directly
+VALUE_POOL_MAX_PROVIDERS = int(os.getenv("VALUE_POOL_MAX_PROVIDERS", "256"))
+
+
+class ValueRing:
+    """
+    Fixed-size ring of generated values for one provider.
+
+    Reads advance a cursor and never block. `fresh` counts values that
+    haven't been served yet; when it reaches zero the ring wraps and serves
+    older values again until the worker catches up.
+    """
+    __slots__ = ("values", "position", "fresh")
+
+    def __init__(self):
+        self.values = []
+        self.position = 0
+        self.fresh = 0
+
+    def take(self):
+        values = self.values
+        value = values[self.position]
+        self.position = (self.position + 1) % len(values)
+        if self.fresh:
+            self.fresh -= 1
+        return value
+
+    def take_many(self, count: int) -> list:
+        """count unread values (count must not exceed fresh)."""
+        values = self.values
+        start = self.position
+        end = start + count
+        if end <= len(values):
+            taken = values[start:end]
+        else:
+            end -= len(values)
+            taken = values[start:] + values[:end]
+        self.position = end % len(values)
+        self.fresh -= count
+        return taken
+
+    def fill(self, batch: list):
+        """Overwrites already-served slots with new values, in read order."""
+        if not self.values:
+            self.values = batch
+            self.position = 0
+            self.fresh = len(batch)
+            return
+        size = len(self.values)
+        count = min(len(batch), size - self.fresh)
+        start = self.position + self.fresh
+        for offset in range(count):
+            self.values[(start + offset) % size] = batch[offset]
+        self.fresh += count
+
+
+class ValuePool:
+    """
+    Serves Faker values from per-provider rings that a background task
+    refills in bulk, so rendering a tag is a list lookup instead of a
+    provider call. Has the same get(name) interface as ProviderTable.
+
+    A provider gets its ring the first time a template uses it; until the
+    first batch lands, its values are generated inline.
+    """
+
+    def __init__(self, size: int = VALUE_POOL_SIZE):
+        self.size = size
+        # Inline fallback, used on the event loop
+        self.providers = ProviderTable(Faker())
+        # Refills run in a worker thread with their own instance
+        self._fill_providers = ProviderTable(Faker())
+        self._rings = {}
+        self._takers = {}
+        # Picks $repeat lengths; values themselves come from the rings
+        self.random = random.Random()
+        self._wake = asyncio.Event()
+        self._task = None
+        self.hits = 0
+        self.reused = 0
+        self.misses = 0
+
+    def get(self, provider_name: str):
+        try:
+            return self._takers[provider_name]
+        except KeyError:
+            func = self.providers.get(provider_name)
+            if func is not None and self.size > 0 and len(self._rings) < VALUE_POOL_MAX_PROVIDERS:
+                func = self._make_taker(provider_name, func)
+            self._takers[provider_name] = func
+            return func
+
+    def _make_taker(self, provider_name: str, func):
+        ring = ValueRing()
+        self._rings[provider_name] = ring
+        self._wake.set()
+
+        def take():
+            if ring.values:
+                if ring.fresh:
+                    self.hits += 1
+                else:
+                    self.reused += 1
+                    self._wake.set()
+                return ring.take()
+            self.misses += 1
+            return func()
+        return take
+
+    def batch(self, provider_name: str, count: int) -> list:
+        """
+        count values at once, for $repeat lists. Unread pooled values are
+        used first and the rest is generated inline: repeating old values
+        across a single list would show up as duplicates.
+        """
+        self.get(provider_name)  # registers the ring on first use
+        ring = self._rings.get(provider_name)
+        if ring is None or not ring.fresh:
+            if ring is not None:
+                self.misses += count
+                self._wake.set()
+            return self.providers.batch(provider_name, count)
+
+        taken = ring.take_many(min(count, ring.fresh))
+        self.hits += len(taken)
+        if len(taken) < count:
+            self.misses += count - len(taken)
+            self._wake.set()
+            taken.extend(self.providers.batch(provider_name, count - len(taken)))
+        return taken
+
+    def start(self):
+        if self._task is None and self.size > 0:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            # Before Python 3.12, wait_for can swallow a cancel that lands as
+            # the refill loop is woken; cancel again until it has stopped.
+            while not self._task.done():
+                self._task.cancel()
+                await asyncio.wait([self._task], timeout=1)
+            self._task = None
+
+    async def run(self):
+        """Long-running refill loop; start it once per process."""
+        low_water = self.size * VALUE_POOL_LOW_WATER
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=VALUE_POOL_REFILL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            for provider_name, ring in list(self._rings.items()):
+                if ring.values and ring.fresh >= low_water:
+                    continue
+                count = self.size - ring.fresh if ring.values else self.size
+                try:
+                    batch = await asyncio.to_thread(self._generate, provider_name, count)
+                except Exception as e:
+                    print(f"Value pool refill for {provider_name} failed: {e}")
+                    continue
+                ring.fill(batch)
+
+    def _generate(self, provider_name: str, count: int) -> list:
+        providers = self._fill_providers
+        return [call_provider(providers, provider_name) for _ in range(count)]
+
+    def stats(self) -> dict:
+        return {
+            "providers": len(self._rings),
+            "size": self.size,
+            "hits_total": self.hits,
+            "reused_total": self.reused,
+            "misses_total": self.misses,
+        }
+
+
+class SeededProviders:
+    """
+    A dedicated Faker for reproducible responses. Reseeding it per request
+    leaves the shared instances untouched; rendering is synchronous, so one
+    instance is safe to reuse on the event loop.
+    """
+
+    def __init__(self):
+        self.fake = Faker()
+        self.providers = ProviderTable(self.fake)
+
+    def for_seed(self, seed: str) -> ProviderTable:
+        self.fake.seed_instance(seed)
+        return self.providers
+
+
+value_pool = ValuePool()
+seeded_providers = SeededProviders()
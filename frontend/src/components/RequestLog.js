@@ -1,47 +1,71 @@
 import React, { useState, useEffect } from 'react';
+import { useAuthContext } from '../context/AuthContext';
 
 const API_WS_URL = 'ws://localhost:8000/ws/logs'; // Connects to Manager API
 
 const RequestLog = ({ projectSlug }) => {
     const [logs, setLogs] = useState([]);
     const [status, setStatus] = useState('Connecting...');
+    const { token } = useAuthContext();
 
     useEffect(() => {
-        const ws = new WebSocket(API_WS_URL);
+        if (!token) return;
 
-        ws.onopen = () => {
-            setStatus('Live: Waiting for requests...');
-        };
+        let ws = null;
+        let reconnectTimer = null;
+        let closedByUs = false;
+        // Stream id of the newest log we've shown; "0" asks for recent history
+        let lastId = '0';
+
+        const connect = () => {
+            // The server only sends logs for projects this token can see,
+            // replaying anything newer than lastId before going live
+            const params = new URLSearchParams({ token, project_slug: projectSlug, since: lastId });
+            ws = new WebSocket(`${API_WS_URL}?${params}`);
+
+            ws.onopen = () => {
+                setStatus('Live: Waiting for requests...');
+            };
 
-        ws.onmessage = (event) => {
-            try {
-                // We receive a JSON string from Redis, so we must parse it
-                const newLog = JSON.parse(event.data);
+            ws.onmessage = (event) => {
+                try {
+                    // We receive a JSON string from Redis, so we must parse it
+                    const newLog = JSON.parse(event.data);
+                    if (newLog.id) {
+                        lastId = newLog.id;
+                    }
 
-                // Only show logs relevant to the current project slug
-                if (newLog.project_slug === projectSlug) {
-                    setLogs((prevLogs) => [newLog, ...prevLogs].slice(0, 50)); // Keep only the last 50
+                    // Only show logs relevant to the current project slug
+                    if (newLog.project_slug === projectSlug) {
+                        setLogs((prevLogs) => [newLog, ...prevLogs].slice(0, 50)); // Keep only the last 50
+                    }
+                } catch (e) {
+                    console.error("Failed to parse log message:", e);
                 }
-            } catch (e) {
-                console.error("Failed to parse log message:", e);
-            }
-        };
+            };
 
-        ws.onerror = (error) => {
-            console.error("WebSocket Error:", error);
-            setStatus('Error: Check backend and Redis connection.');
-        };
+            ws.onerror = (error) => {
+                console.error("WebSocket Error:", error);
+                setStatus('Error: Check backend and Redis connection.');
+            };
 
-        ws.onclose = () => {
-            setStatus('Disconnected. Trying to reconnect...');
-            // In a real app, you would add a timeout/reconnect logic here
+            ws.onclose = () => {
+                if (closedByUs) return;
+                setStatus('Disconnected. Trying to reconnect...');
+                // Nothing is lost while we're away: the reconnect backfills from lastId
+                reconnectTimer = setTimeout(connect, 2000);
+            };
         };
 
+        connect();
+
         // Cleanup function to close the WebSocket when the component unmounts
         return () => {
+            closedByUs = true;
+            clearTimeout(reconnectTimer);
             ws.close();
         };
-    }, [projectSlug]);
+    }, [projectSlug, token]);
 
     return (
         <div style={{ marginTop: '2rem', border: '1px solid #ccc', borderRadius: '8px', padding: '1rem', background: '#f9f9f9' }}>
@@ -119,7 +119,7 @@ const DashboardPage = () => {
                 {/* This is the new clickable link */}
                 <Link to={`/org/${org.id}`} style={{ textDecoration: 'none', color: 'black' }}>
                   <span style={{ fontSize: '1.25rem', fontWeight: 'bold' }}>{org.name}</span>
-                  <p>{org.projects.length} Projects • {org.members.length} Members</p>
+                  <p>{org.project_count} Projects • {org.member_count} Members</p>
                 </Link>
               </li>
             ))}
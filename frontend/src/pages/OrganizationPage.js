@@ -7,6 +7,8 @@ import '../App.css'; // Use the same styles
 const OrganizationPage = () => {
   const { orgId } = useParams(); // Get the org ID from the URL
   const [org, setOrg] = useState(null);
+  const [projects, setProjects] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null); // Set while more projects remain
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const { logout } = useAuthContext();
@@ -19,19 +21,22 @@ const OrganizationPage = () => {
   const fetchOrgData = useCallback(async () => {
     setLoading(true);
     try {
-      // Fetch all orgs and find the one we need
-      const response = await api.get('/organizations');
-      const currentOrg = response.data.find(o => o.id === parseInt(orgId));
-
-      if (currentOrg) {
-        setOrg(currentOrg);
-      } else {
-        setError('Organization not found or you are not a member.');
-      }
+      // The org (with members) and the first page of its projects
+      const [orgResponse, projectsResponse] = await Promise.all([
+        api.get(`/organizations/${orgId}`),
+        api.get(`/organizations/${orgId}/projects`)
+      ]);
+      setOrg(orgResponse.data);
+      setProjects(projectsResponse.data);
+      setNextCursor(projectsResponse.headers['x-next-cursor'] || null);
       setLoading(false);
     } catch (err) {
       console.error("Failed to fetch org", err);
-      setError('Failed to load organization.');
+      if (err.response && err.response.status === 404) {
+        setError('Organization not found or you are not a member.');
+      } else {
+        setError('Failed to load organization.');
+      }
       setLoading(false);
       if (err.response && err.response.status === 401) {
         logout();
@@ -43,6 +48,17 @@ const OrganizationPage = () => {
     fetchOrgData();
   }, [fetchOrgData]);
 
+  const loadMoreProjects = async () => {
+    try {
+      const response = await api.get(`/organizations/${orgId}/projects`, { params: { cursor: nextCursor } });
+      setProjects((prev) => [...prev, ...response.data]);
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (err) {
+      console.error("Failed to load more projects", err);
+      setError('Failed to load more projects.');
+    }
+  };
+
   // --- Create Project Handler ---
   const handleCreateProject = async (e) => {
     e.preventDefault();
@@ -119,11 +135,11 @@ const OrganizationPage = () => {
       </div>
 
       <h3>Projects</h3>
-      {org.projects.length === 0 ? (
+      {projects.length === 0 ? (
         <p>This organization has no projects yet.</p>
       ) : (
         <ul style={{ listStyle: 'none', padding: 0 }}>
-          {org.projects.map(project => (
+          {projects.map(project => (
             // This is the new clickable link
             <li key={project.id} style={{ background: 'white', border: '1px solid #ccc', padding: '1rem', borderRadius: '8px', marginBottom: '1rem' }}>
               <Link to={`/project/${project.id}`} style={{ textDecoration: 'none', color: 'black' }}>
@@ -135,6 +151,11 @@ const OrganizationPage = () => {
           ))}
         </ul>
       )}
+      {nextCursor && (
+        <button onClick={loadMoreProjects} style={{ padding: '0.5rem 1rem' }}>
+          Load more projects
+        </button>
+      )}
 
       <hr style={{ margin: '2rem 0' }} />
 
@@ -20,25 +20,16 @@ const ProjectPage = () => {
   const fetchProjectData = useCallback(async () => {
     setLoading(true);
     try {
-      const orgsResponse = await api.get('/organizations');
-      let foundProject = null;
-      for (const org of orgsResponse.data) {
-        const proj = org.projects.find(p => p.id === parseInt(projectId));
-        if (proj) {
-          foundProject = proj;
-          break;
-        }
-      }
-
-      if (foundProject) {
-        setProject(foundProject);
-      } else {
-        setError('Project not found or you do not have access.');
-      }
+      const response = await api.get(`/projects/${projectId}`);
+      setProject(response.data);
       setLoading(false);
     } catch (err) {
       console.error("Failed to fetch project", err);
-      setError('Failed to load project.');
+      if (err.response && err.response.status === 404) {
+        setError('Project not found or you do not have access.');
+      } else {
+        setError('Failed to load project.');
+      }
       setLoading(false);
       if (err.response && err.response.status === 401) {
         logout();